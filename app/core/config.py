@@ -7,4 +7,90 @@ load_dotenv()  # Loads environment variables from .env
 
 SECRET_KEY = os.environ.get("SECRET_KEY", "your-secret-key")
 MONGO_DETAILS = os.environ.get("MONGO_URI", "mongodb://localhost:27017")
-# print(MONGO_DETAILS, SECRET_KEY, end="\n")
\ No newline at end of file
+# print(MONGO_DETAILS, SECRET_KEY, end="\n")
+
+# Generation models (shared process-wide through app/services/generation/registry.py)
+EMBEDDING_MODEL_NAME = os.environ.get("EMBEDDING_MODEL_NAME", "sentence-transformers/all-mpnet-base-v2")
+LLM_MODEL_NAME = os.environ.get("LLM_MODEL_NAME", "llama-3.3-70b-versatile")
+LLM_MODEL_PROVIDER = os.environ.get("LLM_MODEL_PROVIDER", "groq")
+RAG_PROMPT_NAME = os.environ.get("RAG_PROMPT_NAME", "rlm/rag-prompt")
+CHUNK_SIZE = int(os.environ.get("CHUNK_SIZE", "1000"))
+CHUNK_OVERLAP = int(os.environ.get("CHUNK_OVERLAP", "200"))
+# Load the models at application startup so the first request doesn't pay for it
+WARMUP_MODELS = os.environ.get("WARMUP_MODELS", "true").lower() in ("1", "true", "yes")
+# How many ingested documents to keep in memory for reuse across requests
+MAX_DOCUMENT_SESSIONS = int(os.environ.get("MAX_DOCUMENT_SESSIONS", "16"))
+# Embedding cache: in-memory LRU plus a memory-mapped on-disk table (set the dir to "" to disable)
+EMBEDDING_CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR", ".cache/embeddings")
+EMBEDDING_CACHE_MAX_ITEMS = int(os.environ.get("EMBEDDING_CACHE_MAX_ITEMS", "50000"))
+EMBEDDING_CACHE_DTYPE = os.environ.get("EMBEDDING_CACHE_DTYPE", "float16")
+# Rows the disk table may grow to; every worker indexes all of its keys in memory (~150 bytes each)
+EMBEDDING_CACHE_DISK_MAX_ROWS = int(os.environ.get("EMBEDDING_CACHE_DISK_MAX_ROWS", "200000"))
+# Generation concurrency: threads for embedding/retrieval, and how many LLM generations may run at once
+GENERATION_WORKER_THREADS = int(os.environ.get("GENERATION_WORKER_THREADS", "4"))
+MAX_CONCURRENT_GENERATIONS = int(os.environ.get("MAX_CONCURRENT_GENERATIONS", "8"))
+GENERATION_ADMISSION_TIMEOUT = float(os.environ.get("GENERATION_ADMISSION_TIMEOUT", "30"))
+# Retrieval: chunks per query, and "exact" or "approximate" (k-means IVF) search for large documents
+RETRIEVAL_K = int(os.environ.get("RETRIEVAL_K", "4"))
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "exact")
+RETRIEVAL_APPROXIMATE_MIN_CHUNKS = int(os.environ.get("RETRIEVAL_APPROXIMATE_MIN_CHUNKS", "5000"))
+RETRIEVAL_N_PROBE = int(os.environ.get("RETRIEVAL_N_PROBE", "8"))
+# Compact chunk storage: embeddings kept in memory as "float16", "int8" (per-vector scale; smaller and faster
+# to score but slightly lossy ranking) or "float32", and ingested documents saved as memory-mapped files under
+# DOCUMENT_STORE_DIR for fast reloads (set to "" to disable). Mongo always keeps the full float32 embeddings.
+VECTOR_STORAGE_DTYPE = os.environ.get("VECTOR_STORAGE_DTYPE", "float16")
+DOCUMENT_STORE_DIR = os.environ.get("DOCUMENT_STORE_DIR", ".cache/documents")
+# Streaming ingestion: pypdf extraction runs in a process pool and overlaps with embedding
+INGEST_PROCESSES = int(os.environ.get("INGEST_PROCESSES", str(min(4, os.cpu_count() or 1))))
+INGEST_PAGES_PER_TASK = int(os.environ.get("INGEST_PAGES_PER_TASK", "8"))
+INGEST_EMBED_BATCH_SIZE = int(os.environ.get("INGEST_EMBED_BATCH_SIZE", "32"))
+INGEST_QUEUE_BATCHES = int(os.environ.get("INGEST_QUEUE_BATCHES", "4"))
+# Background document-processing jobs (per API worker)
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.environ.get("JOB_QUEUE_SIZE", "100"))
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", "1.0"))
+# Each API worker heartbeats the jobs it holds; a queued/running job not heartbeated for this long is failed
+JOB_HEARTBEAT_SECONDS = float(os.environ.get("JOB_HEARTBEAT_SECONDS", "10"))
+JOB_STALE_SECONDS = float(os.environ.get("JOB_STALE_SECONDS", "60"))
+# Generation result cache (in-process LRU in front of Mongo); semantic mode reuses answers for near-identical concepts
+RESULT_CACHE_ENABLED = os.environ.get("RESULT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RESULT_CACHE_TTL_SECONDS = int(os.environ.get("RESULT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+RESULT_CACHE_MAX_ITEMS = int(os.environ.get("RESULT_CACHE_MAX_ITEMS", "1000"))
+RESULT_CACHE_SEMANTIC = os.environ.get("RESULT_CACHE_SEMANTIC", "false").lower() in ("1", "true", "yes")
+RESULT_CACHE_SEMANTIC_THRESHOLD = float(os.environ.get("RESULT_CACHE_SEMANTIC_THRESHOLD", "0.92"))
+# Batch quiz/flashcard generation: concepts per request and concurrent LLM calls per batch
+BATCH_MAX_CONCEPTS = int(os.environ.get("BATCH_MAX_CONCEPTS", "25"))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "4"))
+# Key-concept extraction: minimum to return, concurrent top-up requests, and name-similarity dedup threshold
+MIN_KEY_CONCEPTS = int(os.environ.get("MIN_KEY_CONCEPTS", "3"))
+KEY_CONCEPTS_SUPPLEMENTARY_REQUESTS = int(os.environ.get("KEY_CONCEPTS_SUPPLEMENTARY_REQUESTS", "2"))
+KEY_CONCEPT_DEDUP_THRESHOLD = float(os.environ.get("KEY_CONCEPT_DEDUP_THRESHOLD", "0.9"))
+# Context packing between retrieve and generate: MMR re-rank, merge overlapping chunks, fit a token budget.
+# The default budget fits the RETRIEVAL_K full chunks the unpacked context sent, so packing never drops one
+CONTEXT_PACKING = os.environ.get("CONTEXT_PACKING", "true").lower() in ("1", "true", "yes")
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", str(RETRIEVAL_K * CHUNK_SIZE // 4)))
+CONTEXT_FETCH_K = int(os.environ.get("CONTEXT_FETCH_K", "12"))
+CONTEXT_MAX_CHUNKS = int(os.environ.get("CONTEXT_MAX_CHUNKS", "4"))
+CONTEXT_MMR_LAMBDA = float(os.environ.get("CONTEXT_MMR_LAMBDA", "0.7"))
+# Auth: PBKDF2 rounds (existing hashes are upgraded on login), hashing threads, and the verified-token cache
+AUTH_HASH_ROUNDS = int(os.environ.get("AUTH_HASH_ROUNDS", "29000"))
+AUTH_HASH_WORKERS = int(os.environ.get("AUTH_HASH_WORKERS", "2"))
+AUTH_TOKEN_CACHE_TTL_SECONDS = int(os.environ.get("AUTH_TOKEN_CACHE_TTL_SECONDS", "60"))
+AUTH_TOKEN_CACHE_MAX_ITEMS = int(os.environ.get("AUTH_TOKEN_CACHE_MAX_ITEMS", "10000"))
+# Mongo connection pool and timeouts (milliseconds), and whether to create indexes at startup
+MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get("MONGO_SOCKET_TIMEOUT_MS", "60000"))
+MONGO_ENSURE_INDEXES = os.environ.get("MONGO_ENSURE_INDEXES", "true").lower() in ("1", "true", "yes")
+# Uploads: size limit, size above which an upload is written to a temp file instead of kept in memory, read size
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+UPLOAD_SPILL_BYTES = int(os.environ.get("UPLOAD_SPILL_BYTES", str(8 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = int(os.environ.get("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+# Shared embedding service: when the socket is set, API workers send embedding requests to one
+# process that owns the model (python -m app.services.generation.embedding_server) instead of loading it
+EMBEDDING_SERVICE_SOCKET = os.environ.get("EMBEDDING_SERVICE_SOCKET", "")
+EMBEDDING_SERVICE_MAX_BATCH = int(os.environ.get("EMBEDDING_SERVICE_MAX_BATCH", "64"))
+EMBEDDING_SERVICE_MAX_WAIT_MS = float(os.environ.get("EMBEDDING_SERVICE_MAX_WAIT_MS", "5"))
+EMBEDDING_SERVICE_TIMEOUT = float(os.environ.get("EMBEDDING_SERVICE_TIMEOUT", "60"))
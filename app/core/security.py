@@ -1,19 +1,57 @@
 # app/core/security.py
 
+import asyncio
 import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
 from jose import jwt
-from app.core.config import SECRET_KEY
-from passlib.hash import pbkdf2_sha256
+from app.core.config import SECRET_KEY, AUTH_HASH_ROUNDS, AUTH_HASH_WORKERS
+from passlib.context import CryptContext
 
 ALGORITHM = "HS256"
 
+# Hashes made with a different number of rounds still verify, and are flagged for rehashing
+pwd_context = CryptContext(schemes=["pbkdf2_sha256"], pbkdf2_sha256__rounds=AUTH_HASH_ROUNDS)
+
+# Key derivation is deliberately slow; run it on its own small pool so a burst of
+# logins neither blocks the event loop nor queues behind generation work
+_hash_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_hash_executor() -> ThreadPoolExecutor:
+    global _hash_executor
+    if _hash_executor is None:
+        _hash_executor = ThreadPoolExecutor(max_workers=AUTH_HASH_WORKERS, thread_name_prefix="auth")
+    return _hash_executor
+
+
+def shutdown_hash_executor() -> None:
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False, cancel_futures=True)
+        _hash_executor = None
+
+
 def hash_password(password: str) -> str:
-    hash = pbkdf2_sha256.hash(password)
-    print("Hashed password from hash_password", hash)
-    return hash
+    return pwd_context.hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pbkdf2_sha256.verify(plain_password, hashed_password)
+    return pwd_context.verify(plain_password, hashed_password)
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password; if it matches but was hashed with outdated settings,
+    also return a fresh hash to store in place of the old one.
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+async def hash_password_async(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_hash_executor(), hash_password, password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_hash_executor(), verify_and_update_password, plain_password, hashed_password)
 
 def create_access_token(data: dict, expires_delta: datetime.timedelta = None):
     to_encode = data.copy()
@@ -1,7 +1,50 @@
-from app.core.config import MONGO_DETAILS
+from app.core.config import (
+    MONGO_DETAILS,
+    MONGO_MAX_POOL_SIZE,
+    MONGO_MIN_POOL_SIZE,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    MONGO_CONNECT_TIMEOUT_MS,
+    MONGO_SOCKET_TIMEOUT_MS,
+)
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING
 
 
-client = AsyncIOMotorClient(MONGO_DETAILS)
+client = AsyncIOMotorClient(
+    MONGO_DETAILS,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+)
 db = client.learnify
-# db = client["learnify"] # This is also valid
\ No newline at end of file
+# db = client["learnify"] # This is also valid
+
+# (collection, keys, options) for every index the app relies on
+INDEXES = [
+    # Logins and registration look users up by name; the unique index makes register atomic
+    ("users", [("username", ASCENDING)], {"unique": True}),
+    ("contents", [("id", ASCENDING)], {"unique": True}),
+    # `documents` is only ever read by _id, which Mongo indexes already
+    # Chunks are loaded per document in order
+    ("document_chunks", [("document_id", ASCENDING), ("index", ASCENDING)], {"unique": True}),
+    # At most one active (queued, running or done) job per document and kind; enforces JobManager.submit's dedup
+    ("jobs", [("document_id", ASCENDING), ("kind", ASCENDING)],
+     {"unique": True, "partialFilterExpression": {"active": True}, "name": "active_job"}),
+    # The stale-job sweep
+    ("jobs", [("status", ASCENDING), ("heartbeat_at", ASCENDING)], {}),
+    # Expired cache entries are removed by Mongo itself
+    ("generation_cache", [("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ("generation_cache", [("document_id", ASCENDING), ("operation", ASCENDING), ("prompt_version", ASCENDING)], {}),
+]
+
+
+async def ensure_indexes() -> None:
+    """Create the indexes in INDEXES; creating an index that already exists is a no-op."""
+    for collection, keys, options in INDEXES:
+        try:
+            await db[collection].create_index(keys, **options)
+        except Exception as e:
+            # A unique index can't be built over existing duplicates; keep serving without it
+            print(f"Error creating index on {collection} {keys}: {e}")
@@ -1,12 +1,60 @@
 # app/main.py
 
-from fastapi import FastAPI
+import asyncio
+import importlib
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from app.routes.auth import auth
 from app.routes.content import content
+from app.core.config import WARMUP_MODELS, MONGO_ENSURE_INDEXES, MAX_UPLOAD_BYTES
+from app.db.database import ensure_indexes
+from app.core.security import shutdown_hash_executor
+from app.core.metrics import metrics, request_seconds, server_timing_header, start_request_timings
+from app.services.generation.registry import get_model_registry
+from app.services.generation.concurrency import shutdown_executor, shutdown_process_pool
+from app.services.generation.jobs import get_job_manager
 
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI(debug=True)
+
+# Progress of the background warmup, reported by /health/ready
+warmup = {"status": "disabled", "seconds": None, "error": None}
+
+
+def warm_generation_stack() -> None:
+    started = time.perf_counter()
+    warmup["status"] = "running"
+    try:
+        # Import the generation modules too, so the first request pays for neither
+        importlib.import_module("app.services.generation.generate")
+        health = get_model_registry().warmup()
+        warmup["status"] = "ready" if health["ready"] else "failed"
+    except Exception as e:
+        print(f"Error warming up the generation stack: {e}")
+        warmup.update(status="failed", error=str(e))
+    warmup["seconds"] = time.perf_counter() - started
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if MONGO_ENSURE_INDEXES:
+        await ensure_indexes()
+    # Load the generation stack in the background; auth and CRUD routes serve meanwhile
+    if WARMUP_MODELS:
+        warmup["status"] = "pending"
+        app.state.warmup_task = asyncio.create_task(asyncio.to_thread(warm_generation_stack))
+    get_job_manager().start()
+    yield
+    await get_job_manager().stop()
+    shutdown_process_pool()
+    shutdown_executor()
+    shutdown_hash_executor()
+
+
+app = FastAPI(debug=True, lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -15,8 +63,58 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+
+@app.middleware("http")
+async def limit_request_size(request: Request, call_next):
+    # Refuse an oversized upload before its body is read and spooled; allow some
+    # room for the multipart envelope and the other form fields
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > MAX_UPLOAD_BYTES + 64 * 1024:
+        return JSONResponse({"detail": f"Request body is larger than {MAX_UPLOAD_BYTES} bytes"}, status_code=413)
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def record_timings(request: Request, call_next):
+    # Stages timed while handling the request are reported back in Server-Timing.
+    # Streaming responses only include the stages that ran before the first byte.
+    timings = start_request_timings()
+    started = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - started
+    route = request.scope.get("route")
+    request_seconds.observe(elapsed, method=request.method, route=getattr(route, "path", "unmatched"))
+    timings.append(("total", elapsed))
+    response.headers["Server-Timing"] = server_timing_header(timings)
+    return response
+
+
 # Include the auth routes (registration, login, token generation)
 app.include_router(auth.router)
-app.include_router(content.content_router)
\ No newline at end of file
+app.include_router(content.content_router)
+
+
+@app.get("/health/models", tags=["Health"])
+async def models_health():
+    return get_model_registry().health()
+
+
+@app.get("/health/ready", tags=["Health"])
+async def readiness():
+    # 503 until the models are warm, so a load balancer can hold generation traffic back
+    ready = warmup["status"] in ("ready", "disabled")
+    return JSONResponse({"ready": ready, **warmup}, status_code=200 if ready else 503)
+
+
+@app.get("/health/cache", tags=["Health"])
+async def cache_health():
+    from app.services.generation.result_cache import get_result_cache
+    return get_result_cache().stats()
+
+
+@app.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
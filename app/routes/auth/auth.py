@@ -1,49 +1,83 @@
 # app/routes/auth.py
 
+import time
+from collections import OrderedDict
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from app.models import User, UserIn
 from app.db.database import db
-from app.core.security import hash_password, verify_password, create_access_token
-from app.core.config import SECRET_KEY
+from pymongo.errors import DuplicateKeyError
+from app.core.security import hash_password_async, verify_and_update_password_async, create_access_token, ALGORITHM
+from app.core.config import SECRET_KEY, AUTH_TOKEN_CACHE_TTL_SECONDS, AUTH_TOKEN_CACHE_MAX_ITEMS
 from jose import jwt
 
 router = APIRouter(prefix="", tags=["User"])
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Verified tokens -> (cache expiry, user). An entry never outlives its token's
+# `exp`, and is dropped after AUTH_TOKEN_CACHE_TTL_SECONDS so user changes show up.
+_token_cache: "OrderedDict[str, tuple]" = OrderedDict()
+
+def get_cached_user(token: str):
+    entry = _token_cache.get(token)
+    if entry is None:
+        return None
+    if entry[0] <= time.time():
+        del _token_cache[token]
+        return None
+    _token_cache.move_to_end(token)
+    return entry[1]
+
+def cache_user(token: str, user: User, token_expires_at: float):
+    _token_cache[token] = (min(token_expires_at, time.time() + AUTH_TOKEN_CACHE_TTL_SECONDS), user)
+    _token_cache.move_to_end(token)
+    while len(_token_cache) > AUTH_TOKEN_CACHE_MAX_ITEMS:
+        _token_cache.popitem(last=False)
+
 async def get_user(username: str):
-    user = await db.users.find_one({"username": username})
+    user = await db.users.find_one({"username": username}, {"_id": 0, "username": 1, "hashed_password": 1})
     if user:
         return User(**user)
     return None
 
 @router.post("/register")
 async def register(user_in: UserIn):
-    # Check if user already exists.
-    if await get_user(user_in.username):
+    # Insert only if the username is free, in one atomic upsert. Two concurrent
+    # registrations can both miss the match; the unique index rejects the second.
+    hashed_password = await hash_password_async(user_in.password)
+    try:
+        result = await db.users.update_one(
+            {"username": user_in.username},
+            {"$setOnInsert": {"hashed_password": hashed_password}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="User already exists")
+    if result.upserted_id is None:
         raise HTTPException(status_code=400, detail="User already exists")
-    
-    # Create a user dictionary and store it in MongoDB.
-    user_dict = {
-        "username": user_in.username,
-        "hashed_password": hash_password(user_in.password)
-    }
-    print("User dict from register route", user_dict)
-    await db.users.insert_one(user_dict)
     return {"message": "User created successfully"}
 
 @router.post("/token")
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     user = await get_user(form_data.username)
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user:
         raise HTTPException(status_code=400, detail="Incorrect username or password")
+    verified, new_hash = await verify_and_update_password_async(form_data.password, user.hashed_password)
+    if not verified:
+        raise HTTPException(status_code=400, detail="Incorrect username or password")
+    if new_hash:
+        # Hashed with an outdated number of rounds; upgrade it now that we know the password
+        await db.users.update_one({"username": user.username}, {"$set": {"hashed_password": new_hash}})
     access_token = create_access_token(data={"sub": user.username})
     return {"access_token": access_token, "token_type": "bearer"}
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
+    user = get_cached_user(token)
+    if user:
+        return user
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if not username:
             raise HTTPException(status_code=401, detail="Invalid token")
@@ -53,6 +87,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     user = await get_user(username)
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
+    cache_user(token, user, payload.get("exp", time.time()))
     return user
 
 @router.get("/users/me")
@@ -1,15 +1,25 @@
 from fastapi import APIRouter, HTTPException, Depends, File, UploadFile, Query, Form
+from fastapi.responses import StreamingResponse
+from typing import TYPE_CHECKING, List, Optional
+import asyncio
+import json
 from app.db.database import db
+from pymongo.errors import DuplicateKeyError
 from app.models import Content, SummaryResponse
 
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 
-from app.services.generation.generate import GenerationService
+# The generation stack (langchain, langgraph, pypdf, the models) is imported
+# inside the handlers that need it, so the CRUD routes and app startup don't pay for it
+from app.services.generation.errors import DocumentNotFoundError
+from app.services.generation.registry import get_model_registry
+from app.services.generation.concurrency import GenerationBusyError
+from app.services.generation.upload import UploadedDocument, UploadTooLargeError, receive_upload
+from app.services.generation.jobs import get_job_manager, get_job, serialize_job, JobQueueFullError
+from app.core.config import JOB_POLL_INTERVAL, BATCH_MAX_CONCEPTS
 
-import tempfile
-import shutil
-import os  # For file cleanup
-from PyPDF2 import PdfReader
+if TYPE_CHECKING:
+    from app.services.generation.generate import GenerationService
 
 # from nltk.tokenize import sent_tokenize, word_tokenize
 # from nltk.corpus import stopwords
@@ -24,7 +34,9 @@ from PyPDF2 import PdfReader
 content_router = APIRouter(prefix="/content", tags=["Content"])
 
 async def get_content(content_id : str):
-    contentRes = await db.contents.find_one({"id": content_id})
+    contentRes = await db.contents.find_one(
+        {"id": content_id}, {"_id": 0, "id": 1, "title": 1, "description": 1, "associated_with": 1}
+    )
     if contentRes:
         return Content(**contentRes)
     return None
@@ -34,160 +46,414 @@ oauth2service = OAuth2PasswordBearer(tokenUrl="token")
 
 @content_router.post('/create')
 async def create_content(content : Content):
-    #check if content already exists
-    #if exists, return HTTPException
-    #else, create content
-    if await get_content(content.id):
-        raise HTTPException(status_code=400, detail="Content already exists")
-    content_dict = {
-        "id": content.id,
+    #create content unless the id is taken, atomically (upsert + unique index on id)
+    #if it exists, return HTTPException
+    content_fields = {
         "title": content.title,
         "description": content.description,
         "associated_with": content.associated_with.model_dump()
     }
-    await db.contents.insert_one(content_dict)
+    try:
+        result = await db.contents.update_one({"id": content.id}, {"$setOnInsert": content_fields}, upsert=True)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Content already exists")
+    if result.upserted_id is None:
+        raise HTTPException(status_code=400, detail="Content already exists")
     return {"message": "Content created successfully"}
 
 
+@content_router.post("/documents")
+async def upload_document(pdf_file: UploadFile = File(..., description="The uploaded PDF file")):
+    """
+    Ingest a PDF once and return its document ID (the SHA-256 of its bytes).
+    The concept, quiz and flashcard endpoints accept this ID instead of the file.
+    """
+    upload = None
+    try:
+        from app.services.generation.document_store import store_document, document_exists
+
+        # Read (and hash) the upload as it arrives
+        upload = await read_upload(pdf_file)
+
+        # A byte-identical upload is answered straight from the store
+        if await document_exists(upload.document_id):
+            return {"document_id": upload.document_id, "created": False}
+
+        session = await store_document(upload.source, get_model_registry(), upload.filename, document_id=upload.document_id)
+        return {"document_id": session.document_id, "chunks": len(session.chunks), "created": True}
+    except HTTPException:
+        raise
+    except Exception as e:
+        # Log the error for debugging
+        print(f"Error storing document: {e}")
+        raise HTTPException(status_code=500, detail=f"Error storing document: {str(e)}")
+    finally:
+        # Clean up the upload (and its temp file, if it spilled to disk)
+        pdf_file.file.close()
+        if upload is not None:
+            upload.close()
+
+
+async def read_upload(pdf_file: UploadFile, **kwargs) -> UploadedDocument:
+    """Receive an upload with receive_upload, answering 413 if it is too large."""
+    try:
+        return await receive_upload(pdf_file, **kwargs)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+
+async def get_generation_service(pdf_file: Optional[UploadFile], document_id: Optional[str]):
+    """
+    Build a GenerationService from a stored document ID, or from an uploaded PDF.
+    Returns the service and the received upload, if any; the caller closes it.
+    """
+    from app.services.generation.generate import GenerationService
+
+    if document_id:
+        return GenerationService(document_id=document_id), None
+    if pdf_file is None:
+        raise HTTPException(status_code=400, detail="Either pdf_file or document_id is required")
+    upload = await read_upload(pdf_file)
+    try:
+        return GenerationService(upload=upload), upload
+    except BaseException:
+        # The caller never sees the upload, so remove its temp file here
+        upload.close()
+        raise
+
+
 @content_router.post("/generate_summary", response_model=SummaryResponse)
 async def generate_summary(pdf_file: UploadFile):
+    upload = None
     try:
-        # Save the uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            shutil.copyfileobj(pdf_file.file, temp_file)
-            temp_file_path = temp_file.name
-
-        # Initialize the GenerationService with the temporary file path
-        generation_service = GenerationService(file_path=temp_file_path)
-
-        # Generate summary
-        summary = await generation_service.getSummary(
-            {"question" : "Generate a detailed summary of the given document in 300 words."}
-        )
-
-        # Generate key concepts
-        raw_key_concepts = await generation_service.getKeyConcepts({
-           "question" : "Generate me the key points of the document and a short description for each key point. Give me response in the following format: Name of Key Point 1: Description 1\n\n Name of Key Point 2: Description 2\n\n Name of Key Point 3: Description 3 etc. Don't give me any other text or extra strings. Just give me the response in the format I asked. Always generate atleast 3 key points each with a name and description."}
-           )
-        key_concepts = [
-            {"key_concept": concept["key_point"], "description": concept["description"]}
-            for concept in raw_key_concepts
-        ]  # Map key_point to key_concept
-
-        # Use key concepts as topics (for simplicity)
-        topics = [concept["key_concept"] for concept in key_concepts]
-
-        # Generate quizzes (mocked for now, as GenerationService doesn't handle quizzes directly)
-        quizzes = [
-            {
-                "question": f"What is the meaning of '{concept['key_concept']}'?",
-                "options": [concept["key_concept"], "Option 2", "Option 3", "Option 4"]
-            }
-            for concept in key_concepts
-        ]
-
-        # Format the response
-        formatted_response = {
-            "summary": summary.strip(),
-            "key_concepts": key_concepts,  # Use the corrected key_concepts
-            "topics": topics,
-            "quizzes": quizzes,
-        }
-
-        return formatted_response
+        from app.services.generation.generate import GenerationService
+
+        # Read (and hash) the upload as it arrives
+        upload = await read_upload(pdf_file)
+
+        # Initialize the GenerationService with the received upload
+        generation_service = GenerationService(upload=upload)
+
+        # Summary, key concepts, topics and quizzes in one go
+        return await generation_service.generateSummaryResponse()
+    except HTTPException:
+        raise
+    except GenerationBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         # Log the error for debugging
         print(f"Error processing file: {e}")
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
     finally:
-        # Clean up the temporary file
+        # Clean up the upload (and its temp file, if it spilled to disk)
         pdf_file.file.close()
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
+        if upload is not None:
+            upload.close()
 
 
 @content_router.post("/get_key_concept_details")
 async def get_key_concept_details(
-    pdf_file: UploadFile = File(..., description="The uploaded PDF file"),
+    pdf_file: Optional[UploadFile] = File(None, description="The uploaded PDF file"),
+    document_id: Optional[str] = Form(None, description="ID returned by /content/documents, used instead of pdf_file"),
     concept: str = Form(..., description="The key concept to extract details for")
 ):
+    upload = None
     try:
-        # Save the uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            shutil.copyfileobj(pdf_file.file, temp_file)
-            temp_file_path = temp_file.name
-
-        # Initialize the GenerationService with the temporary file path
-        generation_service = GenerationService(file_path=temp_file_path)
+        # Reuse a stored document when an ID is given, otherwise ingest the upload
+        generation_service, upload = await get_generation_service(pdf_file, document_id)
 
         # Use the getKeyConceptDetails method to generate detailed information about the key concept
         detailed_info = await generation_service.getKeyConceptDetails(concept)
 
         return {"concept": concept, "details": detailed_info}
+    except HTTPException:
+        raise
+    except GenerationBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except DocumentNotFoundError:
+        raise HTTPException(status_code=404, detail="Document not found")
     except Exception as e:
         # Log the error for debugging
         print(f"Error processing key concept details: {e}")
         raise HTTPException(status_code=500, detail=f"Error processing key concept details: {str(e)}")
     finally:
-        # Clean up the temporary file
-        pdf_file.file.close()
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
+        # Clean up the upload (and its temp file, if it spilled to disk)
+        if pdf_file is not None:
+            pdf_file.file.close()
+        if upload is not None:
+            upload.close()
 
 
 @content_router.post("/generate_quizzes")
 async def generate_quizzes(
-    pdf_file: UploadFile = File(..., description="The uploaded PDF file"),
+    pdf_file: Optional[UploadFile] = File(None, description="The uploaded PDF file"),
+    document_id: Optional[str] = Form(None, description="ID returned by /content/documents, used instead of pdf_file"),
     concept: str = Form(..., description="The key concept to generate quizzes for")
 ):
+    upload = None
     try:
-        # Save the uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            shutil.copyfileobj(pdf_file.file, temp_file)
-            temp_file_path = temp_file.name
-
-        # Initialize the GenerationService with the temporary file path
-        generation_service = GenerationService(file_path=temp_file_path)
+        # Reuse a stored document when an ID is given, otherwise ingest the upload
+        generation_service, upload = await get_generation_service(pdf_file, document_id)
 
         # Use the generateQuizzesForKeyConcept method to generate quizzes for the key concept
         quizzes = await generation_service.generateQuizzesForKeyConcept(concept)
 
         return {"concept": concept, "quizzes": quizzes}
+    except HTTPException:
+        raise
+    except GenerationBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except DocumentNotFoundError:
+        raise HTTPException(status_code=404, detail="Document not found")
     except Exception as e:
         # Log the error for debugging
         print(f"Error generating quizzes for key concept: {e}")
         raise HTTPException(status_code=500, detail=f"Error generating quizzes for key concept: {str(e)}")
     finally:
-        # Clean up the temporary file
-        pdf_file.file.close()
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
+        # Clean up the upload (and its temp file, if it spilled to disk)
+        if pdf_file is not None:
+            pdf_file.file.close()
+        if upload is not None:
+            upload.close()
 
 
 @content_router.post("/generate_flashcards")
 async def generate_flashcards(
-    pdf_file: UploadFile = File(..., description="The uploaded PDF file"),
+    pdf_file: Optional[UploadFile] = File(None, description="The uploaded PDF file"),
+    document_id: Optional[str] = Form(None, description="ID returned by /content/documents, used instead of pdf_file"),
     concept: str = Form(..., description="The key concept to generate flashcards for")
 ):
+    upload = None
     try:
-        # Save the uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            shutil.copyfileobj(pdf_file.file, temp_file)
-            temp_file_path = temp_file.name
-
-        # Initialize the GenerationService with the temporary file path
-        generation_service = GenerationService(file_path=temp_file_path)
+        # Reuse a stored document when an ID is given, otherwise ingest the upload
+        generation_service, upload = await get_generation_service(pdf_file, document_id)
 
         # Use the generateFlashcardsForKeyConcept method to generate flashcards for the key concept
         flashcards = await generation_service.generateFlashcardsForKeyConcept(concept)
 
         return {"concept": concept, "flashcards": flashcards}
+    except HTTPException:
+        raise
+    except GenerationBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except DocumentNotFoundError:
+        raise HTTPException(status_code=404, detail="Document not found")
     except Exception as e:
         # Log the error for debugging
         print(f"Error generating flashcards for key concept: {e}")
         raise HTTPException(status_code=500, detail=f"Error generating flashcards for key concept: {str(e)}")
     finally:
-        # Clean up the temporary file
+        # Clean up the upload (and its temp file, if it spilled to disk)
+        if pdf_file is not None:
+            pdf_file.file.close()
+        if upload is not None:
+            upload.close()
+
+
+async def generate_for_concepts(pdf_file, document_id, concepts: List[str], method: str, label: str):
+    # Shared body of the batch quiz / flashcard endpoints
+    if not concepts:
+        raise HTTPException(status_code=400, detail="At least one concept is required")
+    if len(concepts) > BATCH_MAX_CONCEPTS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_CONCEPTS} concepts per request")
+    upload = None
+    try:
+        # Reuse a stored document when an ID is given, otherwise ingest the upload
+        generation_service, upload = await get_generation_service(pdf_file, document_id)
+        results = await getattr(generation_service, method)(concepts)
+        return {"results": results}
+    except HTTPException:
+        raise
+    except GenerationBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except DocumentNotFoundError:
+        raise HTTPException(status_code=404, detail="Document not found")
+    except Exception as e:
+        # Log the error for debugging
+        print(f"Error generating {label} for key concepts: {e}")
+        raise HTTPException(status_code=500, detail=f"Error generating {label} for key concepts: {str(e)}")
+    finally:
+        # Clean up the upload (and its temp file, if it spilled to disk)
+        if pdf_file is not None:
+            pdf_file.file.close()
+        if upload is not None:
+            upload.close()
+
+
+@content_router.post("/generate_quizzes/batch")
+async def generate_quizzes_batch(
+    pdf_file: Optional[UploadFile] = File(None, description="The uploaded PDF file"),
+    document_id: Optional[str] = Form(None, description="ID returned by /content/documents, used instead of pdf_file"),
+    concepts: List[str] = Form(..., description="The key concepts to generate quizzes for (repeat the field)")
+):
+    return await generate_for_concepts(pdf_file, document_id, concepts, "generateQuizzesForKeyConcepts", "quizzes")
+
+
+@content_router.post("/generate_flashcards/batch")
+async def generate_flashcards_batch(
+    pdf_file: Optional[UploadFile] = File(None, description="The uploaded PDF file"),
+    document_id: Optional[str] = Form(None, description="ID returned by /content/documents, used instead of pdf_file"),
+    concepts: List[str] = Form(..., description="The key concepts to generate flashcards for (repeat the field)")
+):
+    return await generate_for_concepts(pdf_file, document_id, concepts, "generateFlashcardsForKeyConcepts", "flashcards")
+
+def format_sse(event: str, data) -> str:
+    # One Server-Sent Event frame
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@content_router.post("/jobs")
+async def submit_summary_job(pdf_file: UploadFile = File(..., description="The uploaded PDF file")):
+    """
+    Queue a summary job and return its ID immediately. Poll /content/jobs/{job_id}
+    or subscribe to /content/jobs/{job_id}/events for progress and the result.
+    Re-submitting the same PDF returns the existing job.
+    """
+    upload = None
+    try:
+        # Queued jobs may wait a while, so keep their PDFs on disk rather than in
+        # memory; the job closes the upload once processed
+        upload = await read_upload(pdf_file, spill_bytes=0)
+        job, created = await get_job_manager().submit(upload)
+        if created:
+            upload = None
+        return {"job_id": job["_id"], "status": job["status"], "deduplicated": not created}
+    except HTTPException:
+        raise
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        # Log the error for debugging
+        print(f"Error submitting job: {e}")
+        raise HTTPException(status_code=500, detail=f"Error submitting job: {str(e)}")
+    finally:
         pdf_file.file.close()
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
\ No newline at end of file
+        if upload is not None:
+            upload.close()
+
+
+@content_router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    job = await get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return serialize_job(job)
+
+
+@content_router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-Sent Events stream of job progress, ending with `done` or `failed`."""
+    if not await get_job(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        last = None
+        while True:
+            job = serialize_job(await get_job(job_id))
+            snapshot = (job["status"], job["progress"])
+            if snapshot != last:
+                last = snapshot
+                yield format_sse(job["status"] if job["status"] in ("done", "failed") else "progress", job)
+            if job["status"] in ("done", "failed"):
+                return
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def stream_events(generation_service: "GenerationService", upload: Optional[UploadedDocument], produce) -> StreamingResponse:
+    """
+    Wrap a generation in an SSE response: an `ingested` event once the document
+    is ready, then whatever `produce(generation_service)` yields as (event, data)
+    pairs, then `done`. Errors are reported as an `error` event.
+    """
+    async def events():
+        try:
+            session = await generation_service.ingest()
+            yield format_sse("ingested", {"document_id": session.document_id, "chunks": len(session.chunks)})
+            async for event, data in produce(generation_service):
+                yield format_sse(event, data)
+            yield format_sse("done", {})
+        except DocumentNotFoundError:
+            yield format_sse("error", {"status": 404, "detail": "Document not found"})
+        except GenerationBusyError as e:
+            yield format_sse("error", {"status": 503, "detail": str(e)})
+        except Exception as e:
+            print(f"Error streaming generation: {e}")
+            yield format_sse("error", {"status": 500, "detail": str(e)})
+        finally:
+            if upload is not None:
+                upload.close()
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@content_router.post("/stream/summary")
+async def stream_summary(
+    pdf_file: Optional[UploadFile] = File(None, description="The uploaded PDF file"),
+    document_id: Optional[str] = Form(None, description="ID returned by /content/documents, used instead of pdf_file"),
+):
+    """SSE: `ingested`, `summary_token`..., `summary`, `key_concept`..., `done`."""
+    generation_service, upload = await get_generation_service(pdf_file, document_id)
+
+    async def produce(service: "GenerationService"):
+        summary = ""
+        async for token in service.streamSummary():
+            summary += token
+            yield "summary_token", {"text": token}
+        yield "summary", {"summary": summary.strip()}
+        async for concept in service.streamKeyConcepts():
+            yield "key_concept", {"key_concept": concept["key_point"], "description": concept["description"]}
+
+    return stream_events(generation_service, upload, produce)
+
+
+@content_router.post("/stream/key_concept_details")
+async def stream_key_concept_details(
+    pdf_file: Optional[UploadFile] = File(None, description="The uploaded PDF file"),
+    document_id: Optional[str] = Form(None, description="ID returned by /content/documents, used instead of pdf_file"),
+    concept: str = Form(..., description="The key concept to extract details for")
+):
+    """SSE: `ingested`, `details_token`..., `details`, `done`."""
+    generation_service, upload = await get_generation_service(pdf_file, document_id)
+
+    async def produce(service: "GenerationService"):
+        details = ""
+        async for token in service.streamKeyConceptDetails(concept):
+            details += token
+            yield "details_token", {"text": token}
+        yield "details", {"concept": concept, "details": details.strip()}
+
+    return stream_events(generation_service, upload, produce)
+
+
+@content_router.post("/stream/quizzes")
+async def stream_quizzes(
+    pdf_file: Optional[UploadFile] = File(None, description="The uploaded PDF file"),
+    document_id: Optional[str] = Form(None, description="ID returned by /content/documents, used instead of pdf_file"),
+    concept: str = Form(..., description="The key concept to generate quizzes for")
+):
+    """SSE: `ingested`, one `quiz` per parsed question, `done`."""
+    generation_service, upload = await get_generation_service(pdf_file, document_id)
+
+    async def produce(service: "GenerationService"):
+        async for quiz in service.streamQuizzesForKeyConcept(concept):
+            yield "quiz", quiz
+
+    return stream_events(generation_service, upload, produce)
+
+
+@content_router.post("/stream/flashcards")
+async def stream_flashcards(
+    pdf_file: Optional[UploadFile] = File(None, description="The uploaded PDF file"),
+    document_id: Optional[str] = Form(None, description="ID returned by /content/documents, used instead of pdf_file"),
+    concept: str = Form(..., description="The key concept to generate flashcards for")
+):
+    """SSE: `ingested`, one `flashcard` per parsed card, `done`."""
+    generation_service, upload = await get_generation_service(pdf_file, document_id)
+
+    async def produce(service: "GenerationService"):
+        async for flashcard in service.streamFlashcardsForKeyConcept(concept):
+            yield "flashcard", flashcard
+
+    return stream_events(generation_service, upload, produce)
@@ -0,0 +1,211 @@
+# app/services/generation/chunk_store.py
+
+import json
+import os
+import struct
+import tempfile
+from collections.abc import Sequence
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.core.config import VECTOR_STORAGE_DTYPE
+from app.services.generation.retrieval import QuantizedVectors
+
+# Metadata fields every chunk from the ingest pipeline has, stored as one
+# fixed-size record per chunk. Strings are indices into a shared string table;
+# -1 means "not set". Any other key (or a value of an unexpected type) goes to
+# a sparse per-chunk `extra` dict instead.
+RECORD_DTYPE = np.dtype([
+    ("source", np.int32),
+    ("page", np.int32),
+    ("page_label", np.int32),
+    ("total_pages", np.int32),
+    ("start_index", np.int64),
+])
+_STRING_FIELDS = ("source", "page_label")
+
+# File layout: magic, header length, JSON header, then the arrays, each
+# starting on a 64-byte boundary so the memory-mapped views are aligned
+_MAGIC = b"LRNCHNK1"
+_HEADER_LENGTH = struct.Struct("<I")
+_ALIGN = 64
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // _ALIGN) * _ALIGN
+
+
+class ChunkStore(Sequence):
+    """
+    A document's chunks in compact form: all chunk text in one UTF-8 buffer
+    with an offsets array, metadata as fixed-size records, and the embeddings
+    as QuantizedVectors. Behaves as a sequence of Documents, which are built
+    on access. Saved as a single file that load() memory-maps, so a loaded
+    store costs almost no heap and its pages are shared between processes.
+    `clusters` keeps an approximate VectorIndex's k-means clusters alongside.
+    """
+
+    def __init__(
+        self,
+        text: np.ndarray,
+        offsets: np.ndarray,
+        records: np.ndarray,
+        strings: List[str],
+        vectors: QuantizedVectors,
+        extra: Optional[Dict[int, dict]] = None,
+        clusters: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+    ):
+        self.text = text
+        self.offsets = offsets
+        self.records = records
+        self.strings = strings
+        self.vectors = vectors
+        self.extra = extra or {}
+        self.clusters = clusters
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: Iterable[str],
+        metadatas: Iterable[dict],
+        vectors,
+        dtype: str = VECTOR_STORAGE_DTYPE,
+    ) -> "ChunkStore":
+        encoded = [text.encode("utf-8") for text in texts]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(text) for text in encoded], out=offsets[1:])
+        text = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+        records = np.full(len(encoded), -1, dtype=RECORD_DTYPE)
+        strings: List[str] = []
+        string_ids: Dict[str, int] = {}
+        extra: Dict[int, dict] = {}
+        for row, metadata in enumerate(metadatas):
+            for key, value in metadata.items():
+                if key in _STRING_FIELDS and isinstance(value, str):
+                    if value not in string_ids:
+                        string_ids[value] = len(strings)
+                        strings.append(value)
+                    records[key][row] = string_ids[value]
+                elif key in RECORD_DTYPE.names and key not in _STRING_FIELDS and type(value) is int and value >= 0:
+                    records[key][row] = value
+                else:
+                    extra.setdefault(row, {})[key] = value
+
+        vectors = np.asarray(vectors, dtype=np.float32)
+        vectors = vectors.reshape(len(encoded), -1) if len(encoded) else np.empty((0, 0), np.float32)
+        return cls(text, offsets, records, strings, QuantizedVectors.from_vectors(vectors, dtype), extra)
+
+    @classmethod
+    def from_documents(cls, chunks: List[Document], vectors, dtype: str = VECTOR_STORAGE_DTYPE) -> "ChunkStore":
+        return cls.from_texts(
+            [chunk.page_content for chunk in chunks], [chunk.metadata for chunk in chunks], vectors, dtype
+        )
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        index = range(len(self))[index]
+        return Document(page_content=self.page_content(index), metadata=self.metadata(index))
+
+    def page_content(self, index: int) -> str:
+        return self.text[self.offsets[index]:self.offsets[index + 1]].tobytes().decode("utf-8")
+
+    def metadata(self, index: int) -> Dict[str, Any]:
+        metadata: Dict[str, Any] = {}
+        for field, value in zip(RECORD_DTYPE.names, self.records[index].item()):
+            if value < 0:
+                continue
+            metadata[field] = self.strings[value] if field in _STRING_FIELDS else value
+        metadata.update(self.extra.get(index, {}))
+        return metadata
+
+    def vector(self, index: int) -> np.ndarray:
+        return self.vectors.rows([index])[0]
+
+    @property
+    def pages(self) -> np.ndarray:
+        return self.records["page"]
+
+    @property
+    def nbytes(self) -> int:
+        return self.text.nbytes + self.offsets.nbytes + self.records.nbytes + self.vectors.nbytes
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {"text": self.text, "offsets": self.offsets, "records": self.records, "codes": self.vectors.codes}
+        if self.vectors.scales is not None:
+            arrays["scales"] = self.vectors.scales
+        if self.clusters is not None:
+            arrays["centroids"], arrays["labels"] = self.clusters
+        return arrays
+
+    def save(self, path: str) -> None:
+        """Write the store to `path` atomically (a temp file renamed into place)."""
+        arrays = {name: np.ascontiguousarray(array) for name, array in self._arrays().items()}
+        sections, offset = {}, 0
+        for name, array in arrays.items():
+            offset = _aligned(offset)
+            sections[name] = {
+                "offset": offset,
+                "dtype": np.lib.format.dtype_to_descr(array.dtype),
+                "shape": list(array.shape),
+            }
+            offset += array.nbytes
+        header = json.dumps({
+            "sections": sections,
+            "strings": self.strings,
+            "extra": {str(row): metadata for row, metadata in self.extra.items()},
+        }).encode("utf-8")
+        data_start = _aligned(len(_MAGIC) + _HEADER_LENGTH.size + len(header))
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_MAGIC + _HEADER_LENGTH.pack(len(header)) + header)
+                for name, array in arrays.items():
+                    f.seek(data_start + sections[name]["offset"])
+                    f.write(array.tobytes())
+                # Empty trailing arrays still need their (zero-length) place in the file
+                f.truncate(data_start + offset)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> "ChunkStore":
+        """Memory-map a store written by save(). The arrays are read-only views of the file."""
+        buffer = np.memmap(path, dtype=np.uint8, mode="r")
+        if bytes(buffer[:len(_MAGIC)]) != _MAGIC:
+            raise ValueError(f"{path} is not a chunk store file")
+        start = len(_MAGIC)
+        header_length = _HEADER_LENGTH.unpack(bytes(buffer[start:start + _HEADER_LENGTH.size]))[0]
+        start += _HEADER_LENGTH.size
+        header = json.loads(bytes(buffer[start:start + header_length]))
+        data_start = _aligned(start + header_length)
+
+        arrays = {}
+        for name, section in header["sections"].items():
+            dtype = np.lib.format.descr_to_dtype(section["dtype"])
+            shape = tuple(section["shape"])
+            count = int(np.prod(shape))
+            arrays[name] = np.frombuffer(
+                buffer, dtype=dtype, count=count, offset=data_start + section["offset"]
+            ).reshape(shape)
+        return cls(
+            arrays["text"],
+            arrays["offsets"],
+            arrays["records"],
+            header["strings"],
+            QuantizedVectors(arrays["codes"], arrays.get("scales")),
+            {int(row): metadata for row, metadata in header["extra"].items()},
+            (arrays["centroids"], arrays["labels"]) if "centroids" in arrays else None,
+        )
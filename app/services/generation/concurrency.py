@@ -0,0 +1,87 @@
+# app/services/generation/concurrency.py
+
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from app.core.metrics import timer
+from app.core.config import (
+    GENERATION_WORKER_THREADS,
+    MAX_CONCURRENT_GENERATIONS,
+    GENERATION_ADMISSION_TIMEOUT,
+    INGEST_PROCESSES,
+)
+
+
+class GenerationBusyError(RuntimeError):
+    """Raised when no generation slot frees up within the admission timeout."""
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+_slots: Optional[asyncio.Semaphore] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    # Bounded pool for the CPU-bound work (splitting, embedding, similarity search)
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=GENERATION_WORKER_THREADS, thread_name_prefix="generation")
+    return _executor
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call on the generation pool without stalling the event loop."""
+    loop = asyncio.get_running_loop()
+    # Carry the caller's context over so per-request stage timings still reach it
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(), functools.partial(context.run, func, *args, **kwargs))
+
+
+@asynccontextmanager
+async def generation_slot():
+    """
+    Admission control: at most MAX_CONCURRENT_GENERATIONS graph runs at a time
+    per worker. Callers wait up to GENERATION_ADMISSION_TIMEOUT for a slot.
+    """
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(MAX_CONCURRENT_GENERATIONS)
+    try:
+        with timer("admission_wait"):
+            await asyncio.wait_for(_slots.acquire(), timeout=GENERATION_ADMISSION_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise GenerationBusyError("Too many generations in progress, try again later")
+    try:
+        yield
+    finally:
+        _slots.release()
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    # Processes for PDF text extraction (see pdf_worker.py)
+    global _process_pool
+    if _process_pool is None:
+        # spawn, not fork: the parent may already hold torch threads and locks
+        _process_pool = ProcessPoolExecutor(
+            max_workers=INGEST_PROCESSES, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_pool
+
+
+def shutdown_process_pool() -> None:
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
@@ -0,0 +1,136 @@
+# app/services/generation/context.py
+
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.core.config import (
+    CONTEXT_TOKEN_BUDGET,
+    CONTEXT_MAX_CHUNKS,
+    CONTEXT_MMR_LAMBDA,
+    RETRIEVAL_K,
+)
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting English prose
+    return (len(text) + 3) // 4
+
+
+def mmr_order(query: np.ndarray, vectors: np.ndarray, lambda_mult: float = CONTEXT_MMR_LAMBDA) -> List[int]:
+    """
+    Order candidate rows by maximal marginal relevance: each pick balances
+    similarity to the query against similarity to what was already picked.
+    Both inputs must be L2-normalised.
+    """
+    if not len(vectors):
+        return []
+    relevance = vectors @ query
+    redundancy = np.full(len(vectors), -np.inf, dtype=np.float32)
+    remaining = np.ones(len(vectors), dtype=bool)
+    order: List[int] = []
+    for _ in range(len(vectors)):
+        penalty = np.where(np.isinf(redundancy), 0.0, redundancy)
+        scores = lambda_mult * relevance - (1 - lambda_mult) * penalty
+        scores[~remaining] = -np.inf
+        best = int(np.argmax(scores))
+        order.append(best)
+        remaining[best] = False
+        redundancy = np.maximum(redundancy, vectors @ vectors[best])
+    return order
+
+
+def merge_adjacent(chunks: Sequence[Document]) -> List[Document]:
+    """
+    Merge chunks from the same page whose character ranges overlap or touch
+    (by start_index), so the chunk_overlap text is only sent once. Merged
+    chunks keep the position of their earliest member in `chunks`.
+    """
+    spans: Dict[Tuple, List[Tuple[int, int, Document]]] = {}
+    loose: List[Tuple[int, Document]] = []
+    for position, chunk in enumerate(chunks):
+        start = chunk.metadata.get("start_index")
+        if start is None:
+            loose.append((position, chunk))
+            continue
+        key = (chunk.metadata.get("source"), chunk.metadata.get("page"))
+        spans.setdefault(key, []).append((start, position, chunk))
+
+    merged: List[Tuple[int, Document]] = list(loose)
+    for group in spans.values():
+        group.sort(key=lambda item: item[0])
+        start, position, chunk = group[0]
+        text = chunk.page_content
+        metadata = dict(chunk.metadata)
+        for next_start, next_position, next_chunk in group[1:]:
+            end = start + len(text)
+            if next_start <= end:
+                # Append only the part of the next chunk that isn't already covered
+                text += next_chunk.page_content[end - next_start:]
+                position = min(position, next_position)
+            else:
+                merged.append((position, Document(page_content=text, metadata=metadata)))
+                start, position, text, metadata = next_start, next_position, next_chunk.page_content, dict(next_chunk.metadata)
+        merged.append((position, Document(page_content=text, metadata=metadata)))
+    merged.sort(key=lambda item: item[0])
+    return [chunk for _, chunk in merged]
+
+
+def _tokens(chunks: Sequence[Document]) -> int:
+    return sum(estimate_tokens(chunk.page_content) for chunk in chunks)
+
+
+def pack_context(
+    query: np.ndarray,
+    candidates: Sequence[Tuple[int, float]],
+    chunks: Sequence[Document],
+    matrix: np.ndarray,
+    budget_tokens: int = CONTEXT_TOKEN_BUDGET,
+    max_chunks: int = CONTEXT_MAX_CHUNKS,
+    baseline_k: int = RETRIEVAL_K,
+) -> Tuple[List[Document], dict]:
+    """
+    Assemble the prompt context for one query from similarity-ranked
+    `candidates` ((chunk index, score) pairs): re-rank them with MMR using the
+    index's normalised embeddings (an array or QuantizedVectors), then greedily add chunks while the merged
+    (overlap-free) context stays within `budget_tokens`.
+
+    Returns the packed chunks and a report comparing against the plain top
+    `baseline_k` context the pipeline used to send. `tokens_saved` only
+    counts overlap merged away; chunks left out to fit the budget are
+    reported separately as `budget_tokens_dropped`.
+    """
+    indices = [i for i, _ in candidates]
+    # Look each candidate up once; a ChunkStore builds a new Document on every access
+    docs = {i: chunks[i] for i in indices}
+    baseline_tokens = _tokens([docs[i] for i in indices[:baseline_k]])
+    order = [indices[i] for i in mmr_order(query, matrix[indices])] if indices else []
+
+    selected: List[int] = []
+    packed: List[Document] = []
+    for i in order:
+        if len(selected) >= max_chunks:
+            break
+        attempt = merge_adjacent([docs[j] for j in selected + [i]])
+        # Always keep the best chunk, even if it alone is over budget
+        if selected and _tokens(attempt) > budget_tokens:
+            continue
+        selected.append(i)
+        packed = attempt
+
+    raw_tokens = _tokens([docs[i] for i in selected])
+    packed_tokens = _tokens(packed)
+    # What the same packing would have sent with no budget at all
+    unbudgeted_tokens = _tokens(merge_adjacent([docs[i] for i in order[:max_chunks]]))
+    report = {
+        "candidates": len(indices),
+        "chunks_selected": len(selected),
+        "chunks_after_merge": len(packed),
+        "baseline_tokens": baseline_tokens,
+        "packed_tokens": packed_tokens,
+        "overlap_tokens_removed": raw_tokens - packed_tokens,
+        "budget_tokens_dropped": max(0, unbudgeted_tokens - packed_tokens),
+        "tokens_saved": raw_tokens - packed_tokens,
+    }
+    return packed, report
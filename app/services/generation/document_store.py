@@ -0,0 +1,182 @@
+# app/services/generation/document_store.py
+
+import datetime
+import os
+import re
+from typing import Optional
+
+import numpy as np
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError
+
+from app.core.config import EMBEDDING_MODEL_NAME, DOCUMENT_STORE_DIR
+from app.core.metrics import timer
+from app.db.database import db
+from app.services.generation.registry import ModelRegistry
+from app.services.generation.concurrency import run_blocking
+from app.services.generation.chunk_store import ChunkStore
+from app.services.generation.ingest import ProgressCallback
+from app.services.generation.upload import PdfSource, hash_source
+from app.services.generation.session import (
+    DocumentSession,
+    get_cached_session,
+    ingest_document,
+    remember_session,
+)
+
+# Uploaded documents are content-addressed: the document ID is the SHA-256 of the PDF bytes.
+# `documents` holds one record per PDF and `document_chunks` one record per chunk with its
+# embedding stored as raw float32 bytes. Each node also keeps a ChunkStore file per document
+# under DOCUMENT_STORE_DIR, which is memory-mapped on load instead of reading Mongo again.
+
+_SAFE_DOCUMENT_ID = re.compile(r"[A-Za-z0-9_-]+")
+
+
+def local_path(document_id: str) -> Optional[str]:
+    if not DOCUMENT_STORE_DIR or not _SAFE_DOCUMENT_ID.fullmatch(document_id):
+        return None
+    # One directory per model so vectors of different sizes never mix
+    return os.path.join(DOCUMENT_STORE_DIR, EMBEDDING_MODEL_NAME.replace("/", "__"), f"{document_id}.chunks")
+
+
+def load_local(document_id: str) -> Optional[ChunkStore]:
+    path = local_path(document_id)
+    if path is None or not os.path.exists(path):
+        return None
+    try:
+        return ChunkStore.load(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error loading {path}: {e}")
+        return None
+
+
+def save_local(document_id: str, chunks: ChunkStore) -> None:
+    path = local_path(document_id)
+    if path is None:
+        return
+    try:
+        chunks.save(path)
+    except (OSError, TypeError, ValueError) as e:
+        print(f"Error saving {path}: {e}")
+
+
+async def document_exists(document_id: str) -> bool:
+    record = await db.documents.find_one(
+        {"_id": document_id, "embedding_model": EMBEDDING_MODEL_NAME}, {"_id": 1}
+    )
+    return record is not None
+
+
+async def save_document(session: DocumentSession, vectors: np.ndarray, filename: str = None) -> None:
+    """
+    Persist an ingested document with its float32 `vectors` (the session
+    itself may only hold quantised ones). A stored document is never rewritten, so
+    readers can't observe its chunks changing. Chunk writes are upserts keyed
+    by (document_id, index), so nodes saving the same PDF at once converge on
+    the same (identical) chunks instead of conflicting.
+    """
+    if await document_exists(session.document_id):
+        return
+    document_id = session.document_id
+    # Chunks beyond this document's count can only be leftovers of an earlier,
+    # differently chunked save that never got its `documents` record
+    await db.document_chunks.delete_many({"document_id": document_id, "index": {"$gte": len(session.chunks)}})
+    if len(session.chunks):
+        try:
+            await db.document_chunks.bulk_write([
+                ReplaceOne(
+                    {"document_id": document_id, "index": index},
+                    {
+                        "document_id": document_id,
+                        "index": index,
+                        "text": session.chunks.page_content(index),
+                        "metadata": session.chunks.metadata(index),
+                        "vector": np.asarray(vectors[index], dtype=np.float32).tobytes(),
+                    },
+                    upsert=True,
+                )
+                for index in range(len(session.chunks))
+            ], ordered=False)
+        except BulkWriteError as e:
+            # A duplicate key here means another node upserted the same chunk first
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+    # Written last so a `documents` record always points at a complete set of chunks
+    await db.documents.update_one(
+        {"_id": document_id},
+        {
+            "$set": {"filename": filename, "chunk_count": len(session.chunks), "embedding_model": EMBEDDING_MODEL_NAME},
+            "$setOnInsert": {"created_at": datetime.datetime.now(datetime.timezone.utc)},
+        },
+        upsert=True,
+    )
+
+
+async def load_document(document_id: str, registry: ModelRegistry) -> Optional[DocumentSession]:
+    """
+    Rebuild a DocumentSession from stored chunks and vectors without touching
+    the PDF or the embedder: from this node's ChunkStore file if there is one,
+    otherwise from Mongo (and then write the file). Returns None if the
+    document is unknown.
+    """
+    session = get_cached_session(document_id)
+    if session is not None:
+        return session
+
+    with timer("disk_load"):
+        chunks = await run_blocking(load_local, document_id)
+    from_store = chunks is None
+    if from_store:
+        if not await document_exists(document_id):
+            return None
+        texts, metadatas, vectors = [], [], []
+        with timer("store_load"):
+            cursor = db.document_chunks.find(
+                {"document_id": document_id}, {"_id": 0, "text": 1, "metadata": 1, "vector": 1}
+            ).sort("index", 1)
+            async for record in cursor:
+                texts.append(record["text"])
+                metadatas.append(record.get("metadata", {}))
+                vectors.append(np.frombuffer(record["vector"], dtype=np.float32))
+            chunks = await run_blocking(ChunkStore.from_texts, texts, metadatas, vectors)
+
+    clustered = chunks.clusters is not None
+    await registry.load("embeddings")
+    session = await run_blocking(DocumentSession, document_id, chunks, registry)
+    # (Re)write the file if it is missing or lacks the clusters the index just built
+    if from_store or (not clustered and chunks.clusters is not None):
+        with timer("disk_save"):
+            await run_blocking(save_local, document_id, chunks)
+    remember_session(session)
+    return session
+
+
+async def store_document(
+    source: PdfSource,
+    registry: ModelRegistry,
+    filename: str = None,
+    on_progress: Optional[ProgressCallback] = None,
+    document_id: str = None,
+) -> DocumentSession:
+    """
+    Return the session for a PDF (its bytes or a file path), ingesting and
+    persisting it only if this exact file has never been stored before. Pass
+    `document_id` when the hash is already known (e.g. from receive_upload).
+    """
+    if document_id is None:
+        with timer("hash"):
+            document_id = await run_blocking(hash_source, source)
+    session = await load_document(document_id, registry)
+    if session is not None:
+        return session
+
+    async def persist(session: DocumentSession, vectors: np.ndarray):
+        with timer("store_save"):
+            await save_document(session, vectors, filename)
+        with timer("disk_save"):
+            await run_blocking(save_local, session.document_id, session.chunks)
+
+    # Only the caller that actually ingests persists, inside the document's ingest lock
+    return await ingest_document(
+        source, registry, document_id, on_progress=on_progress, name=filename, on_ingested=persist
+    )
@@ -0,0 +1,277 @@
+# app/services/generation/embedding_cache.py
+
+import fcntl
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.core.config import EMBEDDING_CACHE_DISK_MAX_ROWS
+from app.core.metrics import cache_lookups
+
+KEY_BYTES = 32  # SHA-256 digest
+
+
+def embed_queries(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    """
+    Embed several queries in one call when the model supports it
+    (CachedEmbeddings, RemoteEmbeddings), otherwise one embed_query at a time.
+    """
+    batched = getattr(embeddings, "embed_queries", None)
+    if batched is not None:
+        return batched(list(texts))
+    return [embeddings.embed_query(text) for text in texts]
+
+
+def embedding_key(model_name: str, text: str, kind: str = "document") -> bytes:
+    # Documents and queries can be encoded differently, so they never share a key
+    return hashlib.sha256(f"{model_name}\0{kind}\0{text}".encode("utf-8")).digest()
+
+
+class DiskVectorStore:
+    """
+    Append-only on-disk vector table. `keys.bin` holds fixed-width SHA-256
+    keys and `vectors.bin` the matching rows (float16 by default), which are
+    memory-mapped on read so the vectors never have to fit in RAM. The keys
+    do: each process indexes every key in a dict (~150 bytes per row), so the
+    table stops growing at `max_rows` and later embeddings are only cached
+    in memory. Delete the directory to start a fresh table.
+
+    Several processes (e.g. uvicorn workers) may share one directory: appends
+    and repairs hold an exclusive flock on `lock`, and row numbers always come
+    from the position of a key in `keys.bin`, never from a process's own count.
+    Keys appended by other processes are picked up on a lookup miss.
+    """
+
+    def __init__(self, directory: str, dtype: str = "float16", max_rows: int = EMBEDDING_CACHE_DISK_MAX_ROWS):
+        self.directory = directory
+        self.dtype = np.dtype(dtype)
+        self.max_rows = max_rows
+        self.dim: Optional[int] = None
+        self._index: Dict[bytes, int] = {}
+        self._rows = 0  # rows of keys.bin already read into _index
+        self._vectors: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            self._repair()
+            self._refresh()
+
+    @property
+    def _keys_path(self):
+        return os.path.join(self.directory, "keys.bin")
+
+    @property
+    def _vectors_path(self):
+        return os.path.join(self.directory, "vectors.bin")
+
+    @property
+    def _meta_path(self):
+        return os.path.join(self.directory, "meta.json")
+
+    @property
+    def _lock_path(self):
+        return os.path.join(self.directory, "lock")
+
+    @contextmanager
+    def _file_lock(self, operation: int):
+        with open(self._lock_path, "a") as f:
+            fcntl.flock(f, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_meta(self) -> None:
+        if self.dim is None and os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                meta = json.load(f)
+            self.dim = meta["dim"]
+            self.dtype = np.dtype(meta["dtype"])
+
+    def _repair(self) -> None:
+        """Drop rows left by a torn append. Caller holds the exclusive file lock."""
+        self._read_meta()
+        if self.dim is None:
+            return
+        row_bytes = self.dim * self.dtype.itemsize
+        key_rows = os.path.getsize(self._keys_path) // KEY_BYTES if os.path.exists(self._keys_path) else 0
+        vector_rows = os.path.getsize(self._vectors_path) // row_bytes if os.path.exists(self._vectors_path) else 0
+        # Vectors are written before keys, so a torn append leaves at most a few orphaned rows
+        rows = min(key_rows, vector_rows)
+        for path, size in ((self._keys_path, rows * KEY_BYTES), (self._vectors_path, rows * row_bytes)):
+            if os.path.exists(path) and os.path.getsize(path) != size:
+                os.truncate(path, size)
+
+    def _refresh(self) -> None:
+        """Index keys appended since the last refresh (by any process). Caller holds a file lock."""
+        self._read_meta()
+        if self.dim is None or not os.path.exists(self._keys_path):
+            return
+        rows = os.path.getsize(self._keys_path) // KEY_BYTES
+        if rows <= self._rows:
+            return
+        with open(self._keys_path, "rb") as f:
+            f.seek(self._rows * KEY_BYTES)
+            data = f.read((rows - self._rows) * KEY_BYTES)
+        for offset in range(rows - self._rows):
+            self._index[data[offset * KEY_BYTES:(offset + 1) * KEY_BYTES]] = self._rows + offset
+        self._rows = rows
+        # The file grew; remap on the next read
+        self._vectors = None
+
+    def _mapped(self) -> Optional[np.memmap]:
+        if self._vectors is None and self._rows:
+            self._vectors = np.memmap(self._vectors_path, dtype=self.dtype, mode="r", shape=(self._rows, self.dim))
+        return self._vectors
+
+    def __len__(self):
+        return len(self._index)
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self._index.get(key)
+            if row is None:
+                # Another worker may have embedded it since we last looked
+                with self._file_lock(fcntl.LOCK_SH):
+                    self._refresh()
+                row = self._index.get(key)
+                if row is None:
+                    return None
+            return np.asarray(self._mapped()[row], dtype=np.float32)
+
+    def put_many(self, keys: List[bytes], vectors: np.ndarray) -> None:
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            self._repair()
+            self._refresh()
+            new: Dict[bytes, np.ndarray] = {}
+            room = self.max_rows - self._rows
+            for key, vector in zip(keys, vectors):
+                if len(new) >= room:
+                    break
+                if key not in self._index:
+                    new.setdefault(key, vector)
+            if not new:
+                return
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                with open(self._meta_path, "w") as f:
+                    json.dump({"dim": self.dim, "dtype": self.dtype.name}, f)
+            # Rows go at the end of the shared files, wherever other processes have got to
+            start = self._rows
+            block = np.asarray(list(new.values()), dtype=self.dtype)
+            with open(self._vectors_path, "ab") as f:
+                f.write(block.tobytes())
+            with open(self._keys_path, "ab") as f:
+                f.write(b"".join(new))
+            for offset, key in enumerate(new):
+                self._index[key] = start + offset
+            self._rows = start + len(new)
+            self._vectors = None
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Two-level cache in front of an Embeddings model, keyed by model name plus
+    a hash of the text: an in-memory LRU, then an optional memory-mapped disk
+    store. Only the misses are sent to the wrapped model, in a single batch.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, max_items: int = 50000, disk_store: DiskVectorStore = None):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_items = max_items
+        self.disk_store = disk_store
+        self._memory: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _lookup(self, key: bytes) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                cache_lookups.inc(cache="embedding", result="hit")
+                return vector
+        if self.disk_store is not None:
+            vector = self.disk_store.get(key)
+            if vector is not None:
+                self._remember(key, vector)
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                cache_lookups.inc(cache="embedding", result="disk_hit")
+                return vector
+        return None
+
+    def _remember(self, key: bytes, vector: np.ndarray) -> None:
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def _embed(self, texts: List[str], kind: str) -> List[List[float]]:
+        keys = [embedding_key(self.model_name, text, kind) for text in texts]
+        results: List[Optional[np.ndarray]] = [self._lookup(key) for key in keys]
+
+        # Embed each distinct missing text once, even if it repeats within the batch
+        missing: Dict[bytes, str] = {}
+        for key, text, vector in zip(keys, texts, results):
+            if vector is None:
+                missing.setdefault(key, text)
+        if missing:
+            with self._lock:
+                self.misses += len(missing)
+            cache_lookups.inc(len(missing), cache="embedding", result="miss")
+            missing_keys = list(missing)
+            if kind == "query":
+                computed = embed_queries(self.embeddings, [missing[key] for key in missing_keys])
+            else:
+                computed = self.embeddings.embed_documents([missing[key] for key in missing_keys])
+            computed = np.asarray(computed, dtype=np.float32)
+            for key, vector in zip(missing_keys, computed):
+                self._remember(key, vector)
+            if self.disk_store is not None:
+                self.disk_store.put_many(missing_keys, computed)
+            fresh = dict(zip(missing_keys, computed))
+            results = [fresh[key] if vector is None else vector for key, vector in zip(keys, results)]
+
+        return [vector.tolist() for vector in results]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts, "document")
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text], "query")[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts, "query")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_items": len(self._memory),
+            "disk_items": len(self.disk_store) if self.disk_store is not None else 0,
+        }
+
+
+def build_cached_embeddings(embeddings: Embeddings, model_name: str, cache_dir: str, max_items: int, dtype: str) -> CachedEmbeddings:
+    disk_store = None
+    if cache_dir:
+        # One table per model so vectors of different sizes never mix
+        disk_store = DiskVectorStore(os.path.join(cache_dir, model_name.replace("/", "__")), dtype=dtype)
+    return CachedEmbeddings(embeddings, model_name, max_items=max_items, disk_store=disk_store)
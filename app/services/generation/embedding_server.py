@@ -0,0 +1,274 @@
+# app/services/generation/embedding_server.py
+#
+# Shared embedding service. One process owns the embedding model (and the
+# on-disk embedding cache); every API worker talks to it over a Unix socket
+# through RemoteEmbeddings instead of loading its own copy.
+#
+#   python -m app.services.generation.embedding_server --socket /tmp/learnify-embed.sock
+#   EMBEDDING_SERVICE_SOCKET=/tmp/learnify-embed.sock uvicorn app.main:app --workers 4
+#
+# Wire format: each message is a 4-byte big-endian length followed by JSON.
+#   request:  {"kind": "document" | "query", "texts": [...]}
+#   response: {"shm": name, "rows": n, "dim": d} or {"error": message}
+# The vectors travel as a float32 matrix in a POSIX shared memory block named
+# in the response; the client copies it out and unlinks the block.
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from typing import List, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.core.config import (
+    EMBEDDING_SERVICE_SOCKET,
+    EMBEDDING_SERVICE_MAX_BATCH,
+    EMBEDDING_SERVICE_MAX_WAIT_MS,
+    EMBEDDING_SERVICE_TIMEOUT,
+)
+from app.services.generation.embedding_cache import embed_queries
+
+_HEADER = struct.Struct(">I")
+
+
+class EmbeddingServiceError(RuntimeError):
+    pass
+
+
+def _encode(message: dict) -> bytes:
+    body = json.dumps(message).encode("utf-8")
+    return _HEADER.pack(len(body)) + body
+
+
+def _write_shared(matrix: np.ndarray) -> shared_memory.SharedMemory:
+    block = shared_memory.SharedMemory(create=True, size=max(1, matrix.nbytes))
+    np.ndarray(matrix.shape, dtype=np.float32, buffer=block.buf)[:] = matrix
+    # The client unlinks the block once it has read it; stop our resource
+    # tracker from "cleaning up" (and warning about) it when we exit
+    resource_tracker.unregister(block._name, "shared_memory")
+    return block
+
+
+def _discard_shared(block: shared_memory.SharedMemory) -> None:
+    # The reply never reached the client, so the block is ours to remove after all
+    resource_tracker.register(block._name, "shared_memory")
+    block.close()
+    block.unlink()
+
+
+class EmbeddingServer:
+    """
+    Serves embedding requests from many API workers with one model. Requests
+    that arrive while the model is busy (or within `max_wait_ms` of each
+    other) are coalesced into a single embed_documents call of up to
+    `max_batch` texts.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        socket_path: str = EMBEDDING_SERVICE_SOCKET,
+        max_batch: int = EMBEDDING_SERVICE_MAX_BATCH,
+        max_wait_ms: float = EMBEDDING_SERVICE_MAX_WAIT_MS,
+    ):
+        self.embeddings = embeddings
+        self.socket_path = socket_path
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue: asyncio.Queue = asyncio.Queue()
+        # One model call at a time; the model parallelises internally
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding-server")
+        self.batches = 0
+        self.texts = 0
+
+    async def serve(self) -> None:
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        batcher = asyncio.create_task(self._batcher())
+        print(f"Embedding service listening on {self.socket_path}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # One connection per client thread, serving requests one after another
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(_HEADER.size)
+                except asyncio.IncompleteReadError:
+                    return
+                request = json.loads(await reader.readexactly(_HEADER.unpack(header)[0]))
+                future = asyncio.get_running_loop().create_future()
+                await self.queue.put((request["kind"], request["texts"], future))
+                try:
+                    matrix = await future
+                except Exception as e:
+                    writer.write(_encode({"error": str(e)}))
+                    await writer.drain()
+                    continue
+                block = _write_shared(matrix)
+                try:
+                    writer.write(_encode({"shm": block.name, "rows": matrix.shape[0], "dim": matrix.shape[1]}))
+                    await writer.drain()
+                except Exception:
+                    _discard_shared(block)
+                    raise
+                block.close()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _collect(self) -> List[Tuple[str, List[str], asyncio.Future]]:
+        """Wait for a request, then take whatever else arrives within the window, up to max_batch texts."""
+        batch = [await self.queue.get()]
+        size = len(batch[0][1])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            try:
+                item = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(min(remaining, 0.001))
+                continue
+            batch.append(item)
+            size += len(item[1])
+        return batch
+
+    def _embed(self, kind: str, texts: List[str]) -> np.ndarray:
+        if kind == "query":
+            vectors = embed_queries(self.embeddings, texts)
+        else:
+            vectors = self.embeddings.embed_documents(texts)
+        return np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1)
+
+    async def _batcher(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            for kind in ("document", "query"):
+                items = [(texts, future) for item_kind, texts, future in batch if item_kind == kind]
+                if not items:
+                    continue
+                texts = [text for item_texts, _ in items for text in item_texts]
+                try:
+                    matrix = await loop.run_in_executor(self._executor, self._embed, kind, texts)
+                except Exception as e:
+                    for _, future in items:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                self.batches += 1
+                self.texts += len(texts)
+                offset = 0
+                for item_texts, future in items:
+                    if not future.done():
+                        future.set_result(matrix[offset:offset + len(item_texts)])
+                    offset += len(item_texts)
+
+
+class RemoteEmbeddings(Embeddings):
+    """
+    Embeddings client for the shared embedding service. Safe to call from
+    several threads; each thread keeps its own connection.
+    """
+
+    def __init__(self, socket_path: str = EMBEDDING_SERVICE_SOCKET, timeout: float = EMBEDDING_SERVICE_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> socket.socket:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            connection.settimeout(self.timeout)
+            connection.connect(self.socket_path)
+            self._local.connection = connection
+        return connection
+
+    def _reset(self) -> None:
+        connection = getattr(self._local, "connection", None)
+        self._local.connection = None
+        if connection is not None:
+            connection.close()
+
+    @staticmethod
+    def _read_exactly(connection: socket.socket, size: int) -> bytes:
+        data = bytearray()
+        while len(data) < size:
+            chunk = connection.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("Embedding service closed the connection")
+            data += chunk
+        return bytes(data)
+
+    def _call(self, kind: str, texts: List[str]) -> np.ndarray:
+        try:
+            connection = self._connection()
+            connection.sendall(_encode({"kind": kind, "texts": texts}))
+            size = _HEADER.unpack(self._read_exactly(connection, _HEADER.size))[0]
+            response = json.loads(self._read_exactly(connection, size))
+        except OSError as e:
+            # Drop the connection so the next call reconnects (e.g. after a service restart)
+            self._reset()
+            raise EmbeddingServiceError(f"Embedding service unavailable at {self.socket_path}: {e}") from e
+        if "error" in response:
+            raise EmbeddingServiceError(response["error"])
+
+        block = shared_memory.SharedMemory(name=response["shm"])
+        try:
+            return np.ndarray((response["rows"], response["dim"]), dtype=np.float32, buffer=block.buf).copy()
+        finally:
+            block.close()
+            block.unlink()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._call("document", list(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._call("query", [text])[0].tolist()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        # One request for the lot; the service embeds them as queries
+        if not texts:
+            return []
+        return self._call("query", list(texts)).tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared embedding service for the API workers")
+    parser.add_argument("--socket", default=EMBEDDING_SERVICE_SOCKET or "/tmp/learnify-embeddings.sock")
+    parser.add_argument("--max-batch", type=int, default=EMBEDDING_SERVICE_MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=EMBEDDING_SERVICE_MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    # The service loads the real model (and its disk cache) itself, whatever
+    # EMBEDDING_SERVICE_SOCKET says
+    from app.services.generation.registry import ModelRegistry
+    embeddings = ModelRegistry(embedding_service="").embeddings
+    embeddings.embed_query("warmup")
+    asyncio.run(EmbeddingServer(embeddings, args.socket, args.max_batch, args.max_wait_ms).serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+# app/services/generation/errors.py
+#
+# Exceptions the routes map to HTTP errors. Kept free of heavy imports so the
+# routes can catch them without loading the generation stack.
+
+
+class DocumentNotFoundError(LookupError):
+    pass
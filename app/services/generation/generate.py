@@ -1,156 +1,457 @@
 import os
+import json
 import getpass
 import asyncio
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.chat_models import init_chat_model
-from langchain_core.vectorstores import InMemoryVectorStore
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import numpy as np
+from pydantic import ValidationError
 from langchain_core.prompts import ChatPromptTemplate
-from langchain import hub
 from dotenv import load_dotenv
-from langgraph.graph import START, StateGraph
-from typing_extensions import List, TypedDict
+from langgraph.graph import StateGraph
+from typing_extensions import AsyncIterator, List, Optional
 from langchain_core.documents import Document
+from app.services.generation.registry import REQUIRED_COMPONENTS, ModelRegistry, get_model_registry
+from app.services.generation.session import DocumentSession, load_pdf_pages
+from app.services.generation.document_store import load_document, store_document
+from app.services.generation.concurrency import generation_slot, run_blocking
+from app.services.generation.retrieval import VectorIndex, normalize_rows
+from app.services.generation.ingest import ProgressCallback
+from app.services.generation.result_cache import get_result_cache
+from app.services.generation.upload import UploadedDocument
+from app.services.generation.errors import DocumentNotFoundError
+from app.models import KeyConcept
+from app.core.metrics import timer, llm_retries, context_tokens_saved, context_tokens_dropped
+from app.core.config import (
+    BATCH_CONCURRENCY,
+    RESULT_CACHE_ENABLED,
+    MIN_KEY_CONCEPTS,
+    KEY_CONCEPTS_SUPPLEMENTARY_REQUESTS,
+    KEY_CONCEPT_DEDUP_THRESHOLD,
+)
 
 load_dotenv()
 
-os.environ["LANGSMITH_TRACING"] = "true"
-os.environ["LANGSMITH_API_KEY"] = os.getenv("LANGSMITH_API_KEY")
+# Trace to LangSmith only when a key is configured (and tracing wasn't switched off explicitly)
+if os.getenv("LANGSMITH_API_KEY"):
+    os.environ.setdefault("LANGSMITH_TRACING", "true")
+
+# Bump whenever a prompt below changes so cached answers from the old prompt are ignored
+PROMPT_VERSION = "2"
+
+SUMMARY_QUESTION = "Generate a detailed summary of the given document in 300 words."
+KEY_CONCEPTS_QUESTION = (
+    "Generate me the key points of the document and a short description for each key point. "
+    "Give me response in the following format: Name of Key Point 1: Description 1\n\n "
+    "Name of Key Point 2: Description 2\n\n Name of Key Point 3: Description 3 etc. "
+    "Don't give me any other text or extra strings. Just give me the response in the format I asked. "
+    "Always generate at least 3 key points each with a name and description."
+)
+KEY_CONCEPTS_JSON_QUESTION = (
+    "Identify the key concepts of the document. Respond with only a JSON array, no other text, "
+    "where each element is an object of the form "
+    '{"key_concept": "<name of the concept>", "description": "<one or two sentence description>"}. '
+    "Include at least 3 and at most 8 distinct key concepts."
+)
+CONCEPT_DETAILS_QUESTION = "Provide detailed information about the key concept: {concept}"
+QUIZZES_QUESTION = "Generate 3 quiz questions and answers for the key concept: {concept}"
+FLASHCARDS_QUESTION = "Generate 10 flashcards (question-answer pairs) for the key concept: {concept}"
+
+
+def parse_key_concepts(answer: str) -> List[KeyConcept]:
+    """
+    Parse the JSON key-concept answer into validated KeyConcept models. Items
+    that fail validation are skipped; if the answer isn't JSON at all the
+    "Name: description" lines are used instead of wasting the round trip.
+    """
+    start, end = answer.find("["), answer.rfind("]")
+    if start != -1 and end > start:
+        try:
+            items = json.loads(answer[start:end + 1])
+        except json.JSONDecodeError:
+            items = None
+        if isinstance(items, list):
+            concepts = []
+            for item in items:
+                try:
+                    concepts.append(KeyConcept.model_validate(item))
+                except ValidationError:
+                    continue
+            return [concept for concept in concepts if concept.key_concept.strip() and concept.description.strip()]
+    concepts = [parse_key_concept_line(line) for line in answer.splitlines()]
+    return [
+        KeyConcept(key_concept=concept["key_point"], description=concept["description"])
+        for concept in concepts if concept
+    ]
+
+
+def parse_qa_block(block: str) -> Optional[dict]:
+    # "Question: answer" -> {"question", "answer"}; blocks without a colon are skipped
+    if ":" not in block:
+        return None
+    question, answer = block.split(":", 1)
+    return {"question": question.strip(), "answer": answer.strip()}
+
+
+def parse_key_concept_line(line: str) -> Optional[dict]:
+    if ":" not in line:
+        return None
+    key_point, description = line.split(":")[0].strip(), line.split(":")[1].strip()
+    if not key_point or not description:
+        return None
+    return {"key_point": key_point, "description": description}
+
+
+async def iter_blocks(tokens: AsyncIterator[str], separator: str) -> AsyncIterator[str]:
+    """Re-chunk a token stream into complete `separator`-delimited blocks."""
+    buffer = ""
+    async for token in tokens:
+        buffer += token
+        while separator in buffer:
+            block, buffer = buffer.split(separator, 1)
+            if block.strip():
+                yield block.strip()
+    if buffer.strip():
+        yield buffer.strip()
+
 
 class GenerationService:
-    def __init__(self, file_path: str):
+    def __init__(
+        self,
+        file_path: str = None,
+        registry: ModelRegistry = None,
+        document_id: str = None,
+        on_progress: Optional[ProgressCallback] = None,
+        upload: Optional[UploadedDocument] = None,
+    ):
+        # A PDF on disk, a received upload, or the ID of a document stored earlier
         self.file_path = file_path
-        self.embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-mpnet-base-v2")
-        self.llm = init_chat_model("llama-3.3-70b-versatile", model_provider="groq")
-        self.vector_store = InMemoryVectorStore(embedding=self.embeddings)
-        self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, add_start_index=True)
-        self.prompt = hub.pull("rlm/rag-prompt")
+        self.upload = upload
+        self.document_id = document_id
+        self.on_progress = on_progress
+        self.tokens_used = 0
+        # Overlap merged out of prompts, and context left out to fit the token budget
+        self.context_tokens_saved = 0
+        self.context_tokens_truncated = 0
+        # Models are loaded once per process and shared (on first ingest, off the
+        # event loop); only the vector store is per-document
+        self.registry = registry or get_model_registry()
+        self.session: DocumentSession = None
+        self.vector_store: VectorIndex = None
     
     async def get_pdf_text(self) -> List[Document]:
-        loader = PyPDFLoader(self.file_path)
-        pages = []
-        async for page in loader.alazy_load():
-            pages.append(page)
-        return pages
+        return await load_pdf_pages(self.file_path)
+
+    async def ingest(self) -> DocumentSession:
+        # Ingest once per service; repeat calls (and byte-identical uploads) reuse the session
+        if self.session is None:
+            await self.registry.load(*REQUIRED_COMPONENTS)
+            if self.document_id is not None:
+                self.session = await load_document(self.document_id, self.registry)
+                if self.session is None:
+                    raise DocumentNotFoundError(f"Unknown document: {self.document_id}")
+            elif self.upload is not None:
+                with timer("ingest"):
+                    self.session = await store_document(
+                        self.upload.source,
+                        self.registry,
+                        self.upload.filename,
+                        on_progress=self.on_progress,
+                        document_id=self.upload.document_id,
+                    )
+            else:
+                with timer("ingest"):
+                    self.session = await store_document(self.file_path, self.registry, on_progress=self.on_progress)
+            self.document_id = self.session.document_id
+            self.vector_store = self.session.index
+        return self.session
 
     async def process(self) -> StateGraph:
-        # Extract text from the PDF
-        pages = await self.get_pdf_text()
-        # Use text splitter to create chunks
-        all_splits = self.text_splitter.split_documents(pages)
-        self.vector_store.add_documents(documents=all_splits)
-        
-        # Build the retrieval and generation pipeline graph
-        class State(TypedDict):
-            question: str
-            context: List[Document]
-            answer: str
-        
-        def retrieve(state: State):
-            retieved_docs = self.vector_store.similarity_search(state["question"])
-            state["context"] = retieved_docs
-            return state
-
-        def generate(state: State):
-            docs_content = '\n\n'.join([doc.page_content for doc in state["context"]])
-            # Format the input as a string
-            formatted_input = f"Question: {state['question']}\n\nContext:\n{docs_content}"
-            response = self.llm.invoke(formatted_input)  # Pass the formatted string
-            state["answer"] = response.content.strip()  # Ensure the response is properly extracted
-            return state  # Return the updated state as a dict
-
-        graph_builder = StateGraph(State).add_sequence([retrieve, generate])
-        graph_builder.add_edge(START, "retrieve")
-        graph = graph_builder.compile()
-        return graph
+        session = await self.ingest()
+        return session.graph
+
+    async def run_graph(self, question: dict) -> dict:
+        graph = await self.process()
+        # Wait for a free generation slot so one worker can't be flooded with LLM calls
+        async with generation_slot():
+            result = await graph.ainvoke(question)
+        self.tokens_used += result.get("tokens", 0)
+        self._count_context(result.get("context_report", {}))
+        return result
+
+    def _count_context(self, report: dict):
+        saved, dropped = report.get("tokens_saved", 0), report.get("budget_tokens_dropped", 0)
+        self.context_tokens_saved += saved
+        self.context_tokens_truncated += dropped
+        context_tokens_saved.inc(saved)
+        context_tokens_dropped.inc(dropped)
+
+    async def cached_generation(self, operation: str, subject: Optional[str], compute, semantic: bool = False):
+        """
+        Return the cached result of `operation` on this document, or run
+        `compute()` and cache it. With `semantic`, a concept worded slightly
+        differently can reuse a cached answer (if the cache runs in semantic mode).
+        """
+        await self.ingest()
+        cached = await self._cache_get(operation, subject, semantic)
+        if cached is not None:
+            return cached
+        tokens_before = self.tokens_used
+        value = await compute()
+        await self._cache_set(operation, subject, value, self.tokens_used - tokens_before, semantic)
+        return value
+
+    async def _cache_get(self, operation: str, subject: Optional[str], semantic: bool = False):
+        # None on a miss, when caching is off, or when the cache can't be read
+        if not RESULT_CACHE_ENABLED:
+            return None
+        session = await self.ingest()
+        embeddings = self.registry.embeddings if semantic else None
+        try:
+            with timer("cache_lookup"):
+                return await get_result_cache().get(session.document_id, operation, subject, PROMPT_VERSION, embeddings)
+        except Exception as e:
+            print(f"Error reading result cache: {e}")
+            return None
+
+    async def _cache_set(self, operation: str, subject: Optional[str], value, tokens: int, semantic: bool = False):
+        if not RESULT_CACHE_ENABLED:
+            return
+        session = await self.ingest()
+        embeddings = self.registry.embeddings if semantic else None
+        try:
+            await get_result_cache().set(session.document_id, operation, subject, PROMPT_VERSION, value, tokens, embeddings)
+        except Exception as e:
+            print(f"Error writing result cache: {e}")
     
     async def getSummary(self, question: dict) -> dict:
-        graph = await self.process()
-        result = graph.invoke(question)
-        return result["answer"]  # Ensure the correct key is accessed
+        async def compute():
+            result = await self.run_graph(question)
+            return result["answer"]  # Ensure the correct key is accessed
+        return await self.cached_generation("summary", question["question"], compute)
     
     async def getKeyConcepts(self, question1: dict) -> dict:
-        graph = await self.process()
-        generated_key_concepts = []
-        max_retries = 3  # Limit the number of retries to avoid infinite loops
+        return await self.cached_generation("key_concepts", None, lambda: self._generateKeyConcepts(question1))
+
+    async def _generateKeyConcepts(self, question1: dict) -> dict:
+        """
+        Ask for key concepts as JSON and validate them against KeyConcept. If
+        the first answer has too few, the supplementary requests run
+        concurrently rather than one after another, and near-duplicate
+        concepts are merged by embedding similarity.
+        """
+        question1["question"] = KEY_CONCEPTS_JSON_QUESTION
+        result = await self.run_graph(question1)
+        generated_key_concepts = await self.dedupe_key_concepts(parse_key_concepts(result["answer"]))
 
-        for _ in range(max_retries):
+        if len(generated_key_concepts) < MIN_KEY_CONCEPTS:
             # Include already generated key concepts in the prompt to avoid duplicates
-            existing_concepts = "\n".join(
-                [f"{concept['key_point']}: {concept['description']}" for concept in generated_key_concepts]
-            )
-            question_text = (
-                "Generate me the key points of the document and a short description for each key point. "
-                "Give me response in the following format: Name of Key Point 1: Description 1\n\n "
-                "Name of Key Point 2: Description 2\n\n Name of Key Point 3: Description 3 etc. "
-                "Don't give me any other text or extra strings. Just give me the response in the format I asked. "
-                "Always generate at least 3 key points each with a name and description."
-            )
+            existing_concepts = "\n".join(concept.key_concept for concept in generated_key_concepts)
+            question_text = KEY_CONCEPTS_JSON_QUESTION
             if existing_concepts:
                 question_text += f"\n\nAvoid generating the following key concepts:\n{existing_concepts}"
-
-            question1["question"] = question_text
-            result = graph.invoke(question1)
-            output = result["answer"].strip().split("\n\n")[1].split("\n")
-            new_key_concepts = [
-                {"key_point": item.split(":")[0].strip(), "description": item.split(":")[1].strip()}
-                for item in output if ":" in item
+            llm_retries.inc(KEY_CONCEPTS_SUPPLEMENTARY_REQUESTS, operation="key_concepts")
+            with timer("key_concepts_retry"):
+                supplementary = await asyncio.gather(*(
+                    self.run_graph({"question": question_text})
+                    for _ in range(KEY_CONCEPTS_SUPPLEMENTARY_REQUESTS)
+                ))
+            candidates = generated_key_concepts + [
+                concept for extra in supplementary for concept in parse_key_concepts(extra["answer"])
             ]
+            generated_key_concepts = await self.dedupe_key_concepts(candidates)
 
-            # Add new key concepts to the list, avoiding duplicates
-            for concept in new_key_concepts:
-                if concept not in generated_key_concepts:
-                    generated_key_concepts.append(concept)
-
-            # Stop retrying if we have at least 3 unique key concepts
-            if len(generated_key_concepts) >= 3:
-                break
-
-        if len(generated_key_concepts) < 3:
+        if len(generated_key_concepts) < MIN_KEY_CONCEPTS:
             raise ValueError("Insufficient key concepts generated. Ensure the document has enough content.")
 
-        return generated_key_concepts
+        return [
+            {"key_point": concept.key_concept, "description": concept.description}
+            for concept in generated_key_concepts
+        ]
+
+    async def dedupe_key_concepts(self, concepts: List[KeyConcept]) -> List[KeyConcept]:
+        """
+        Drop concepts whose name embeds within KEY_CONCEPT_DEDUP_THRESHOLD
+        (cosine) of an earlier one, so "TF-IDF" and "TF-IDF weighting" count once.
+        """
+        if len(concepts) < 2:
+            return concepts
+        vectors = await run_blocking(self.registry.embeddings.embed_documents, [concept.key_concept for concept in concepts])
+        vectors = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        kept: List[int] = []
+        for i in range(len(concepts)):
+            if not kept or float(np.max(vectors[kept] @ vectors[i])) < KEY_CONCEPT_DEDUP_THRESHOLD:
+                kept.append(i)
+        return [concepts[i] for i in kept]
     
+    async def _report_artifacts(self, count: int):
+        if self.on_progress is not None:
+            await self.on_progress({"artifacts_generated": count})
+
+    async def generateSummaryResponse(self) -> dict:
+        """
+        Build the full /content/generate_summary payload: summary, key concepts,
+        topics and (placeholder) quizzes. `on_progress` gets the running
+        `artifacts_generated` count as each part is done.
+        """
+        # Generate summary
+        summary = await self.getSummary({"question": SUMMARY_QUESTION})
+        await self._report_artifacts(1)
+
+        # Generate key concepts
+        raw_key_concepts = await self.getKeyConcepts({"question": KEY_CONCEPTS_QUESTION})
+        key_concepts = [
+            {"key_concept": concept["key_point"], "description": concept["description"]}
+            for concept in raw_key_concepts
+        ]  # Map key_point to key_concept
+        await self._report_artifacts(1 + len(key_concepts))
+
+        # Use key concepts as topics (for simplicity)
+        topics = [concept["key_concept"] for concept in key_concepts]
+
+        # Generate quizzes (mocked for now, as GenerationService doesn't handle quizzes directly)
+        quizzes = [
+            {
+                "question": f"What is the meaning of '{concept['key_concept']}'?",
+                "options": [concept["key_concept"], "Option 2", "Option 3", "Option 4"]
+            }
+            for concept in key_concepts
+        ]
+
+        # Format the response
+        return {
+            "summary": summary.strip(),
+            "key_concepts": key_concepts,  # Use the corrected key_concepts
+            "topics": topics,
+            "quizzes": quizzes,
+        }
+
     async def getKeyConceptDetails(self, concept: str) -> str:
         """
         Generate detailed information about a specific key concept.
         """
-        graph = await self.process()
-        question = {"question": f"Provide detailed information about the key concept: {concept}"}
-        result = graph.invoke(question)
-        detailed_info = result['answer'].strip()  # Removed `.content` as `result['answer']` is already a string
-        return detailed_info
+        async def compute():
+            question = {"question": CONCEPT_DETAILS_QUESTION.format(concept=concept)}
+            result = await self.run_graph(question)
+            detailed_info = result['answer'].strip()  # Removed `.content` as `result['answer']` is already a string
+            return detailed_info
+        return await self.cached_generation("concept_details", concept, compute, semantic=True)
 
     async def generateQuizzesForKeyConcept(self, concept: str) -> List[dict]:
         """
         Generate quizzes (questions and answers) for a specific key concept.
         """
-        graph = await self.process()
-        question = {"question": f"Generate 3 quiz questions and answers for the key concept: {concept}"}
-        result = graph.invoke(question)
-        quizzes_raw = result['answer'].strip().split("\n\n")
-        quizzes = []
-        for quiz in quizzes_raw:
-            if ":" in quiz:
-                question, answer = quiz.split(":", 1)
-                quizzes.append({"question": question.strip(), "answer": answer.strip()})
-        return quizzes
+        async def compute():
+            question = {"question": QUIZZES_QUESTION.format(concept=concept)}
+            result = await self.run_graph(question)
+            quizzes_raw = result['answer'].strip().split("\n\n")
+            return [quiz for quiz in map(parse_qa_block, quizzes_raw) if quiz]
+        return await self.cached_generation("quizzes", concept, compute, semantic=True)
 
     async def generateFlashcardsForKeyConcept(self, concept: str) -> List[dict]:
         """
         Generate flashcards (question-answer pairs) for a specific key concept.
         """
+        async def compute():
+            question = {"question": FLASHCARDS_QUESTION.format(concept=concept)}
+            result = await self.run_graph(question)
+            flashcards_raw = result['answer'].strip().split("\n\n")
+            return [flashcard for flashcard in map(parse_qa_block, flashcards_raw) if flashcard]
+        return await self.cached_generation("flashcards", concept, compute, semantic=True)
+
+    # -- batch variants ----------------------------------------------------
+
+    async def _generateForKeyConcepts(self, operation: str, question_template: str, concepts: List[str]) -> List[dict]:
+        """
+        Run one per-concept operation for many concepts. Repeated concepts are
+        generated once and cached ones not at all; context for the rest is
+        retrieved in a single batched query and their LLM calls fan out
+        concurrently (capped by BATCH_CONCURRENCY and the generation slots).
+        Each concept still gets its own prompt, so the output matches the
+        single-concept endpoints. Results keep the order of `concepts` and
+        share the per-concept result cache.
+        """
+        session = await self.ingest()
+        unique = list(dict.fromkeys(concept.strip() for concept in concepts if concept.strip()))
+        cached = await asyncio.gather(*(self._cache_get(operation, concept, semantic=True) for concept in unique))
+        results = {concept: value for concept, value in zip(unique, cached) if value is not None}
+        misses = [concept for concept in unique if concept not in results]
+
+        if misses:
+            retrieved = await session.retrieve_many([question_template.format(concept=concept) for concept in misses])
+            for _, report in retrieved:
+                self._count_context(report)
+            limit = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+            async def generate_one(concept: str, context: List[Document]):
+                async with limit, generation_slot():
+                    answer, tokens = await session.answer(question_template.format(concept=concept), context)
+                self.tokens_used += tokens
+                value = [item for item in map(parse_qa_block, answer.split("\n\n")) if item]
+                await self._cache_set(operation, concept, value, tokens, semantic=True)
+                return value
+
+            generated = await asyncio.gather(*(
+                generate_one(concept, context) for concept, (context, _) in zip(misses, retrieved)
+            ))
+            results.update(zip(misses, generated))
+        return [{"concept": concept, operation: results[concept.strip()]} for concept in concepts if concept.strip()]
+
+    async def generateQuizzesForKeyConcepts(self, concepts: List[str]) -> List[dict]:
+        """
+        Generate quizzes for several key concepts in one pass.
+        """
+        return await self._generateForKeyConcepts("quizzes", QUIZZES_QUESTION, concepts)
+
+    async def generateFlashcardsForKeyConcepts(self, concepts: List[str]) -> List[dict]:
+        """
+        Generate flashcards for several key concepts in one pass.
+        """
+        return await self._generateForKeyConcepts("flashcards", FLASHCARDS_QUESTION, concepts)
+
+    # -- streaming variants ------------------------------------------------
+
+    async def stream_graph(self, question: dict) -> AsyncIterator[str]:
+        """
+        Yield the answer's tokens as the chat model produces them. Retrieval
+        runs first, so the first token arrives after one retrieval plus the
+        model's time to first token.
+        """
         graph = await self.process()
-        question = {"question": f"Generate 10 flashcards (question-answer pairs) for the key concept: {concept}"}
-        result = graph.invoke(question)
-        flashcards_raw = result['answer'].strip().split("\n\n")
-        flashcards = []
-        for flashcard in flashcards_raw:
-            if ":" in flashcard:
-                question, answer = flashcard.split(":", 1)
-                flashcards.append({"question": question.strip(), "answer": answer.strip()})
-        return flashcards
+        async with generation_slot():
+            async for message, metadata in graph.astream(question, stream_mode="messages"):
+                if metadata.get("langgraph_node") == "generate" and message.content:
+                    yield message.content
+
+    async def streamSummary(self) -> AsyncIterator[str]:
+        async for token in self.stream_graph({"question": SUMMARY_QUESTION}):
+            yield token
+
+    async def streamKeyConcepts(self) -> AsyncIterator[dict]:
+        # Single pass; each "Name: description" line is emitted as soon as it is complete
+        tokens = self.stream_graph({"question": KEY_CONCEPTS_QUESTION})
+        seen = []
+        async for line in iter_blocks(tokens, "\n"):
+            concept = parse_key_concept_line(line)
+            if concept and concept not in seen:
+                seen.append(concept)
+                yield concept
+
+    async def streamKeyConceptDetails(self, concept: str) -> AsyncIterator[str]:
+        async for token in self.stream_graph({"question": CONCEPT_DETAILS_QUESTION.format(concept=concept)}):
+            yield token
+
+    async def streamQuizzesForKeyConcept(self, concept: str) -> AsyncIterator[dict]:
+        tokens = self.stream_graph({"question": QUIZZES_QUESTION.format(concept=concept)})
+        async for block in iter_blocks(tokens, "\n\n"):
+            quiz = parse_qa_block(block)
+            if quiz:
+                yield quiz
+
+    async def streamFlashcardsForKeyConcept(self, concept: str) -> AsyncIterator[dict]:
+        tokens = self.stream_graph({"question": FLASHCARDS_QUESTION.format(concept=concept)})
+        async for block in iter_blocks(tokens, "\n\n"):
+            flashcard = parse_qa_block(block)
+            if flashcard:
+                yield flashcard
 
 
 if __name__ == "__main__":
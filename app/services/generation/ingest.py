@@ -0,0 +1,147 @@
+# app/services/generation/ingest.py
+
+import asyncio
+import contextlib
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from app.core.config import (
+    INGEST_PROCESSES,
+    INGEST_PAGES_PER_TASK,
+    INGEST_EMBED_BATCH_SIZE,
+    INGEST_QUEUE_BATCHES,
+)
+from app.core.metrics import timer, chunks_ingested, pages_ingested
+from app.services.generation import pdf_worker
+from app.services.generation.concurrency import get_process_pool, run_blocking
+from app.services.generation.registry import ModelRegistry
+from app.services.generation.upload import PdfSource
+
+ProgressCallback = Callable[[dict], Awaitable[None]]
+
+async def iter_pages(
+    source: PdfSource,
+    pages_per_task: int = INGEST_PAGES_PER_TASK,
+    name: Optional[str] = None,
+) -> AsyncIterator[List[Document]]:
+    """
+    Yield the PDF's pages in order, a batch at a time, as soon as each batch is
+    extracted. `source` is the PDF's bytes or a file path. Batches are extracted
+    in parallel across the process pool, with at most two per worker in flight
+    so a huge PDF can't run ahead of the consumer. Metadata matches PyPDFLoader
+    (source, page, page_label, total_pages); `name` is used as the source and
+    defaults to the file path.
+    """
+    loop = asyncio.get_running_loop()
+    name = name or (source if isinstance(source, str) else "upload.pdf")
+    with timer("pdf_open"):
+        total_pages = await run_blocking(pdf_worker.count_pages, source)
+    ranges = [(start, min(start + pages_per_task, total_pages)) for start in range(0, total_pages, pages_per_task)]
+
+    if len(ranges) <= 1:
+        # Not worth a round trip to another process
+        extract = lambda start, stop: run_blocking(pdf_worker.extract_pages, source, start, stop)
+    else:
+        # In-memory PDFs are pickled to the workers once per task; they are
+        # below UPLOAD_SPILL_BYTES, larger ones arrive as a path and are mmapped
+        pool = get_process_pool()
+        extract = lambda start, stop: loop.run_in_executor(pool, pdf_worker.extract_pages, source, start, stop)
+
+    max_in_flight = max(1, INGEST_PROCESSES * 2)
+    in_flight: List[asyncio.Future] = []
+    next_range = 0
+    try:
+        while next_range < len(ranges) or in_flight:
+            while next_range < len(ranges) and len(in_flight) < max_in_flight:
+                in_flight.append(asyncio.ensure_future(extract(*ranges[next_range])))
+                next_range += 1
+            # Yield strictly in page order; later batches keep running meanwhile
+            with timer("pdf_extract"):
+                extracted = await in_flight.pop(0)
+            pages_ingested.inc(len(extracted))
+            yield [
+                Document(
+                    page_content=text,
+                    metadata={"source": name, "page": page_number, "page_label": label, "total_pages": total_pages},
+                )
+                for page_number, label, text in extracted
+            ]
+    finally:
+        # Closed early (the consumer gave up): don't extract batches nobody will read
+        for future in in_flight:
+            future.cancel()
+
+
+async def ingest_chunks(
+    source: PdfSource,
+    registry: ModelRegistry,
+    embed_batch_size: int = INGEST_EMBED_BATCH_SIZE,
+    on_progress: Optional[ProgressCallback] = None,
+    name: Optional[str] = None,
+) -> Tuple[List[Document], List[List[float]]]:
+    """
+    Streaming ingest: pages are split into chunks as they arrive and the
+    chunks are embedded in batches while extraction of later pages continues.
+    The bounded queue between the two stages provides backpressure.
+    `on_progress` is awaited with running totals after every page batch and
+    every embedding batch.
+    """
+    await registry.load("text_splitter", "embeddings")
+    queue: asyncio.Queue = asyncio.Queue(maxsize=INGEST_QUEUE_BATCHES)
+    chunks: List[Document] = []
+    vectors: List[List[float]] = []
+    progress = {"pages_parsed": 0, "chunks_embedded": 0}
+
+    async def report():
+        if on_progress is not None:
+            await on_progress(dict(progress))
+
+    async def produce():
+        pending: List[Document] = []
+        page_batches = iter_pages(source, name=name)
+        cancelled = False
+        try:
+            async for pages in page_batches:
+                # Splitting page by page keeps start_index relative to its page, as before
+                with timer("split"):
+                    pending.extend(await run_blocking(registry.text_splitter.split_documents, pages))
+                progress["pages_parsed"] += len(pages)
+                await report()
+                while len(pending) >= embed_batch_size:
+                    await queue.put(pending[:embed_batch_size])
+                    pending = pending[embed_batch_size:]
+            if pending:
+                await queue.put(pending)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            await page_batches.aclose()
+            # Cancelled means the consumer is gone: a sentinel could block forever on a full queue
+            if not cancelled:
+                await queue.put(None)
+
+    async def consume():
+        while True:
+            batch = await queue.get()
+            if batch is None:
+                return
+            with timer("embed"):
+                batch_vectors = await run_blocking(registry.embeddings.embed_documents, [chunk.page_content for chunk in batch])
+            chunks_ingested.inc(len(batch))
+            chunks.extend(batch)
+            vectors.extend(batch_vectors)
+            progress["chunks_embedded"] += len(batch)
+            await report()
+
+    producer = asyncio.ensure_future(produce())
+    try:
+        await consume()
+        await producer
+    finally:
+        if not producer.done():
+            producer.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await producer
+    return chunks, vectors
@@ -0,0 +1,216 @@
+# app/services/generation/jobs.py
+
+import asyncio
+import datetime
+import uuid
+from typing import List, Optional, Set
+
+from pymongo.errors import DuplicateKeyError
+
+from app.core.config import JOB_WORKERS, JOB_QUEUE_SIZE, JOB_HEARTBEAT_SECONDS, JOB_STALE_SECONDS
+from app.db.database import db
+from app.services.generation.upload import UploadedDocument
+
+# Job records live in the `jobs` collection:
+#   {_id, kind, document_id, filename, status, active, owner, heartbeat_at,
+#    progress, result, error, created_at, updated_at}
+# status goes queued -> running -> done | failed. `active` is true until the
+# job fails; the unique partial index on (document_id, kind, active) allows
+# one active job per document and kind. Queued jobs only exist in the memory
+# of the API worker named by `owner`, which heartbeats them; if it dies, the
+# sweep fails them once the heartbeat is older than JOB_STALE_SECONDS.
+
+JOB_KIND_SUMMARY = "summary"
+PENDING_STATUSES = ["queued", "running"]
+
+
+class JobQueueFullError(RuntimeError):
+    pass
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def serialize_job(job: dict) -> dict:
+    return {
+        "job_id": job["_id"],
+        "kind": job["kind"],
+        "document_id": job["document_id"],
+        "status": job["status"],
+        "progress": job.get("progress", {}),
+        "result": job.get("result"),
+        "error": job.get("error"),
+        "created_at": job["created_at"].isoformat(),
+        "updated_at": job["updated_at"].isoformat(),
+    }
+
+
+async def get_job(job_id: str) -> Optional[dict]:
+    return await db.jobs.find_one({"_id": job_id})
+
+
+async def update_job(job_id: str, **fields) -> None:
+    fields["updated_at"] = _now()
+    await db.jobs.update_one({"_id": job_id}, {"$set": fields})
+
+
+async def fail_job(job_id: str, error: str) -> None:
+    # Inactive jobs no longer count for dedup, so the document can be submitted again
+    await update_job(job_id, status="failed", active=False, error=error)
+
+
+async def fail_stale_jobs(max_age: float = JOB_STALE_SECONDS) -> int:
+    """Fail queued/running jobs whose owner stopped heartbeating them (it crashed or restarted)."""
+    now = _now()
+    result = await db.jobs.update_many(
+        {"status": {"$in": PENDING_STATUSES}, "heartbeat_at": {"$lt": now - datetime.timedelta(seconds=max_age)}},
+        {"$set": {"status": "failed", "active": False, "error": "Job was lost by a restarted worker", "updated_at": now}},
+    )
+    return result.modified_count
+
+
+class JobManager:
+    """
+    Runs document processing in the background. Submitting returns a job ID
+    straight away; a fixed pool of worker tasks drains a bounded queue and
+    persists status, progress and results to Mongo so any API worker can
+    answer a poll.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, queue_size: int = JOB_QUEUE_SIZE):
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        # Identifies this process's jobs for the heartbeat
+        self.owner = uuid.uuid4().hex
+        # Jobs queued or running here; only these are heartbeated
+        self._held: Set[str] = set()
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+            self._tasks.append(asyncio.create_task(self._heartbeat()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, upload: UploadedDocument, kind: str = JOB_KIND_SUMMARY):
+        """
+        Queue a job for `upload`, or return the existing job for the same
+        document and kind. Returns (job, created). When an existing job is
+        reused the caller still owns `upload`; otherwise the job closes it.
+        """
+        document_id = upload.document_id
+        existing = await self._active_job(document_id, kind)
+        if existing is not None:
+            return existing, False
+        if self.queue.full():
+            raise JobQueueFullError("Too many documents waiting to be processed, try again later")
+
+        now = _now()
+        job = {
+            "_id": uuid.uuid4().hex,
+            "kind": kind,
+            "document_id": document_id,
+            "filename": upload.filename,
+            "status": "queued",
+            "active": True,
+            "owner": self.owner,
+            "heartbeat_at": now,
+            "progress": {"pages_parsed": 0, "chunks_embedded": 0, "artifacts_generated": 0},
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        try:
+            await db.jobs.insert_one(job)
+        except DuplicateKeyError:
+            # A concurrent submission of the same document got in first
+            existing = await self._active_job(document_id, kind)
+            if existing is None:
+                raise
+            return existing, False
+
+        try:
+            self.queue.put_nowait((job["_id"], upload))
+            self._held.add(job["_id"])
+        except asyncio.QueueFull:
+            # Filled up by concurrent submissions while we were inserting
+            await fail_job(job["_id"], "Job queue was full")
+            raise JobQueueFullError("Too many documents waiting to be processed, try again later")
+        return job, True
+
+    async def _active_job(self, document_id: str, kind: str) -> Optional[dict]:
+        existing = await db.jobs.find_one(
+            {"document_id": document_id, "kind": kind, "active": True},
+            {"result": 0},  # the caller only needs the job's identity and status
+        )
+        if existing is not None and existing["status"] in PENDING_STATUSES:
+            # Its owner may have died without anyone sweeping yet
+            cutoff = _now() - datetime.timedelta(seconds=JOB_STALE_SECONDS)
+            if await db.jobs.find_one({"_id": existing["_id"], "heartbeat_at": {"$lt": cutoff}}, {"_id": 1}):
+                await fail_stale_jobs()
+                return None
+        return existing
+
+    async def _heartbeat(self):
+        while True:
+            try:
+                if self._held:
+                    await db.jobs.update_many(
+                        {"_id": {"$in": list(self._held)}, "status": {"$in": PENDING_STATUSES}},
+                        {"$set": {"heartbeat_at": _now()}},
+                    )
+                await fail_stale_jobs()
+            except Exception as e:
+                print(f"Error updating job heartbeats: {e}")
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+
+    async def _worker(self):
+        while True:
+            job_id, upload = await self.queue.get()
+            try:
+                await self._run(job_id, upload)
+            except Exception as e:
+                print(f"Error processing job {job_id}: {e}")
+                try:
+                    await fail_job(job_id, str(e))
+                except Exception as fail_error:
+                    # Left pending; it is no longer heartbeated, so the sweep fails it later
+                    print(f"Error failing job {job_id}: {fail_error}")
+            finally:
+                self._held.discard(job_id)
+                upload.close()
+                self.queue.task_done()
+
+    async def _run(self, job_id: str, upload: UploadedDocument):
+        progress = {"pages_parsed": 0, "chunks_embedded": 0, "artifacts_generated": 0}
+
+        async def on_progress(ingest_progress: dict):
+            progress.update(ingest_progress)
+            await update_job(job_id, progress=progress)
+
+        # Deferred so importing this module doesn't load the generation stack
+        from app.services.generation.generate import GenerationService
+
+        await update_job(job_id, status="running")
+        generation_service = GenerationService(upload=upload, on_progress=on_progress)
+        await generation_service.ingest()
+
+        result = await generation_service.generateSummaryResponse()
+        await update_job(job_id, status="done", progress=progress, result=result)
+
+
+_job_manager: Optional[JobManager] = None
+
+
+def get_job_manager() -> JobManager:
+    global _job_manager
+    if _job_manager is None:
+        _job_manager = JobManager()
+    return _job_manager
@@ -0,0 +1,40 @@
+# app/services/generation/pdf_worker.py
+#
+# Runs inside the ingestion process pool. Keep the imports light: every worker
+# process imports this module, and it must not drag in torch or langchain.
+
+import io
+import mmap
+from contextlib import contextmanager
+from typing import List, Tuple, Union
+
+
+@contextmanager
+def open_reader(source: Union[bytes, str]):
+    """
+    A PdfReader over the PDF's bytes, or over a read-only memory map of the
+    file at `source`, so nothing is copied into a second buffer.
+    """
+    from pypdf import PdfReader
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield PdfReader(io.BytesIO(source))
+        return
+    with open(source, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        yield PdfReader(buffer)
+
+
+def count_pages(source: Union[bytes, str]) -> int:
+    with open_reader(source) as reader:
+        return len(reader.pages)
+
+
+def extract_pages(source: Union[bytes, str], start: int, stop: int) -> List[Tuple[int, str, str]]:
+    """Return (page number, page label, text) for pages [start, stop)."""
+    with open_reader(source) as reader:
+        labels = reader.page_labels
+        pages = []
+        for page_number in range(start, min(stop, len(reader.pages))):
+            label = labels[page_number] if page_number < len(labels) else str(page_number + 1)
+            pages.append((page_number, label, reader.pages[page_number].extract_text()))
+        return pages
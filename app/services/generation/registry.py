@@ -0,0 +1,189 @@
+# app/services/generation/registry.py
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from app.core.config import (
+    EMBEDDING_MODEL_NAME,
+    LLM_MODEL_NAME,
+    LLM_MODEL_PROVIDER,
+    RAG_PROMPT_NAME,
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    EMBEDDING_CACHE_DIR,
+    EMBEDDING_CACHE_MAX_ITEMS,
+    EMBEDDING_CACHE_DTYPE,
+    EMBEDDING_SERVICE_SOCKET,
+)
+from app.services.generation.concurrency import run_blocking
+
+# What the pipeline needs; the RAG prompt (a LangChain hub download) is only loaded if asked for
+REQUIRED_COMPONENTS = ("embeddings", "llm", "text_splitter")
+
+
+class ModelRegistry:
+    """
+    Process-wide holder for the expensive generation dependencies (embedder,
+    chat model, text splitter and RAG prompt). Each one is created lazily on
+    first access and then shared by every GenerationService in the process.
+    """
+
+    def __init__(
+        self,
+        embeddings: Any = None,
+        llm: Any = None,
+        text_splitter: Any = None,
+        prompt: Any = None,
+        embedding_service: str = EMBEDDING_SERVICE_SOCKET,
+    ):
+        # Socket of the shared embedding service; empty to load the model in this process
+        self.embedding_service = embedding_service
+        # Anything passed in explicitly is used as-is (handy for swapping in fakes)
+        self._components: Dict[str, Any] = {
+            "embeddings": embeddings,
+            "llm": llm,
+            "text_splitter": text_splitter,
+            "prompt": prompt,
+        }
+        self._load_seconds: Dict[str, float] = {}
+        self._errors: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    # -- loaders -----------------------------------------------------------
+
+    def _load_embeddings(self):
+        from app.services.generation.embedding_cache import build_cached_embeddings
+        if self.embedding_service:
+            from app.services.generation.embedding_server import RemoteEmbeddings
+            # The service owns the model and the disk cache; keep only a memory LRU here
+            return build_cached_embeddings(
+                RemoteEmbeddings(self.embedding_service),
+                EMBEDDING_MODEL_NAME,
+                cache_dir="",
+                max_items=EMBEDDING_CACHE_MAX_ITEMS,
+                dtype=EMBEDDING_CACHE_DTYPE,
+            )
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return build_cached_embeddings(
+            HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME),
+            EMBEDDING_MODEL_NAME,
+            cache_dir=EMBEDDING_CACHE_DIR,
+            max_items=EMBEDDING_CACHE_MAX_ITEMS,
+            dtype=EMBEDDING_CACHE_DTYPE,
+        )
+
+    def _load_llm(self):
+        from langchain.chat_models import init_chat_model
+        return init_chat_model(LLM_MODEL_NAME, model_provider=LLM_MODEL_PROVIDER)
+
+    def _load_text_splitter(self):
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        return RecursiveCharacterTextSplitter(
+            chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, add_start_index=True
+        )
+
+    def _load_prompt(self):
+        from langchain import hub
+        return hub.pull(RAG_PROMPT_NAME)
+
+    def _get(self, name: str):
+        component = self._components[name]
+        if component is not None:
+            return component
+        with self._lock:
+            # Another thread may have finished loading while we waited on the lock
+            component = self._components[name]
+            if component is None:
+                started = time.perf_counter()
+                try:
+                    component = getattr(self, f"_load_{name}")()
+                except Exception as e:
+                    self._errors[name] = str(e)
+                    raise
+                self._load_seconds[name] = time.perf_counter() - started
+                self._errors.pop(name, None)
+                self._components[name] = component
+        return component
+
+    # -- public accessors --------------------------------------------------
+
+    @property
+    def embeddings(self):
+        return self._get("embeddings")
+
+    @property
+    def llm(self):
+        return self._get("llm")
+
+    @property
+    def text_splitter(self):
+        return self._get("text_splitter")
+
+    @property
+    def prompt(self):
+        return self._get("prompt")
+
+    async def load(self, *names: str) -> None:
+        """
+        Make sure the named components are loaded, loading any that aren't on
+        the worker threads so the event loop keeps serving (e.g. while the
+        background warmup holds the lock).
+        """
+        missing = [name for name in names if self._components[name] is None]
+        if missing:
+            await run_blocking(lambda: [self._get(name) for name in missing])
+
+    def warmup(self) -> Dict[str, Any]:
+        """
+        Load every required component and push a tiny input through the
+        embedder so the model weights are paged in before the first real
+        request arrives. Failures are recorded (see health()) instead of raised.
+        """
+        for name in REQUIRED_COMPONENTS:
+            try:
+                self._get(name)
+            except Exception as e:
+                print(f"Error warming up {name}: {e}")
+        try:
+            self.embeddings.embed_query("warmup")
+        except Exception as e:
+            self._errors["embeddings"] = str(e)
+        return self.health()
+
+    def health(self) -> Dict[str, Any]:
+        components = {
+            name: {
+                "loaded": component is not None,
+                "load_seconds": self._load_seconds.get(name),
+                "error": self._errors.get(name),
+            }
+            for name, component in self._components.items()
+        }
+        health = {
+            "ready": all(components[name]["loaded"] for name in REQUIRED_COMPONENTS),
+            "components": components,
+        }
+        embeddings = self._components["embeddings"]
+        if hasattr(embeddings, "stats"):
+            health["embedding_cache"] = embeddings.stats()
+        return health
+
+
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> ModelRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry()
+    return _registry
+
+
+def set_model_registry(registry: ModelRegistry) -> None:
+    """Replace the process-wide registry (e.g. with one built from fakes)."""
+    global _registry
+    _registry = registry
@@ -0,0 +1,191 @@
+# app/services/generation/result_cache.py
+
+import copy
+import datetime
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+import numpy as np
+
+from app.core.config import (
+    RESULT_CACHE_TTL_SECONDS,
+    RESULT_CACHE_MAX_ITEMS,
+    RESULT_CACHE_SEMANTIC,
+    RESULT_CACHE_SEMANTIC_THRESHOLD,
+)
+from app.core.metrics import cache_lookups
+from app.db.database import db
+from app.services.generation.concurrency import run_blocking
+
+# Entries live in the `generation_cache` collection:
+#   {_id: key, document_id, operation, subject, prompt_version, value, tokens,
+#    subject_vector, created_at, expires_at}
+
+
+def normalize_subject(subject: Optional[str]) -> str:
+    # "  Term-Document   Matrix " and "term-document matrix" share an entry
+    return re.sub(r"\s+", " ", (subject or "").strip().lower())
+
+
+def cache_key(document_id: str, operation: str, subject: Optional[str], prompt_version: str) -> str:
+    raw = f"{document_id}\0{operation}\0{normalize_subject(subject)}\0{prompt_version}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Cache of generated answers keyed by (document hash, operation, normalised
+    concept or question, prompt version). An in-process LRU sits in front of
+    Mongo; both tiers honour the TTL. In semantic mode a miss falls back to the
+    cached entry whose subject embedding is closest, if it is within the
+    cosine threshold.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: int = RESULT_CACHE_TTL_SECONDS,
+        max_items: int = RESULT_CACHE_MAX_ITEMS,
+        semantic: bool = RESULT_CACHE_SEMANTIC,
+        semantic_threshold: float = RESULT_CACHE_SEMANTIC_THRESHOLD,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_items = max_items
+        self.semantic = semantic
+        self.semantic_threshold = semantic_threshold
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value, tokens)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+
+    def _memory_get(self, key: str):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return entry
+
+    def _memory_set(self, key: str, value: Any, tokens: int, expires_at: float):
+        with self._lock:
+            self._memory[key] = (expires_at, value, tokens)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def _hit(self, key: str, value: Any, tokens: int, expires_at: float, semantic: bool = False):
+        self._memory_set(key, value, tokens, expires_at)
+        with self._lock:
+            self.hits += 1
+            self.semantic_hits += int(semantic)
+            self.tokens_saved += tokens
+        cache_lookups.inc(cache="result", result="semantic_hit" if semantic else "hit")
+        return copy.deepcopy(value)
+
+    async def _embed(self, embeddings, subject: str) -> Optional[np.ndarray]:
+        if not (self.semantic and embeddings is not None and subject):
+            return None
+        vector = np.asarray(await run_blocking(embeddings.embed_query, normalize_subject(subject)), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    async def _semantic_lookup(self, document_id: str, operation: str, prompt_version: str, vector: np.ndarray):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cursor = db.generation_cache.find(
+            {
+                "document_id": document_id,
+                "operation": operation,
+                "prompt_version": prompt_version,
+                "subject_vector": {"$ne": None},
+                "expires_at": {"$gt": now},
+            },
+            {"value": 1, "tokens": 1, "subject_vector": 1, "expires_at": 1},
+        )
+        best, best_score = None, self.semantic_threshold
+        async for record in cursor:
+            score = float(np.frombuffer(record["subject_vector"], dtype=np.float32) @ vector)
+            if score >= best_score:
+                best, best_score = record, score
+        return best
+
+    async def get(self, document_id: str, operation: str, subject: Optional[str], prompt_version: str, embeddings=None):
+        key = cache_key(document_id, operation, subject, prompt_version)
+        entry = self._memory_get(key)
+        if entry is not None:
+            return self._hit(key, entry[1], entry[2], entry[0])
+
+        record = await db.generation_cache.find_one({"_id": key}, {"value": 1, "tokens": 1, "expires_at": 1})
+        if record and _expires(record) > time.time():
+            return self._hit(key, record["value"], record.get("tokens", 0), _expires(record))
+
+        vector = await self._embed(embeddings, subject)
+        if vector is not None:
+            record = await self._semantic_lookup(document_id, operation, prompt_version, vector)
+            if record:
+                return self._hit(key, record["value"], record.get("tokens", 0), _expires(record), semantic=True)
+
+        with self._lock:
+            self.misses += 1
+        cache_lookups.inc(cache="result", result="miss")
+        return None
+
+    async def set(self, document_id: str, operation: str, subject: Optional[str], prompt_version: str, value: Any, tokens: int = 0, embeddings=None):
+        key = cache_key(document_id, operation, subject, prompt_version)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        expires_at = now + datetime.timedelta(seconds=self.ttl_seconds)
+        self._memory_set(key, copy.deepcopy(value), tokens, expires_at.timestamp())
+
+        vector = await self._embed(embeddings, subject)
+        await db.generation_cache.replace_one(
+            {"_id": key},
+            {
+                "_id": key,
+                "document_id": document_id,
+                "operation": operation,
+                "subject": normalize_subject(subject),
+                "prompt_version": prompt_version,
+                "value": value,
+                "tokens": tokens,
+                "subject_vector": vector.tobytes() if vector is not None else None,
+                "created_at": now,
+                "expires_at": expires_at,
+            },
+            upsert=True,
+        )
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "tokens_saved": self.tokens_saved,
+            "memory_items": len(self._memory),
+        }
+
+
+def _expires(record: dict) -> float:
+    expires_at = record["expires_at"]
+    if expires_at.tzinfo is None:
+        # Mongo hands datetimes back as naive UTC
+        expires_at = expires_at.replace(tzinfo=datetime.timezone.utc)
+    return expires_at.timestamp()
+
+
+_result_cache: Optional[ResultCache] = None
+
+
+def get_result_cache() -> ResultCache:
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = ResultCache()
+    return _result_cache
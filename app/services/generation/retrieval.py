@@ -0,0 +1,224 @@
+# app/services/generation/retrieval.py
+
+from typing import Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.core.config import (
+    RETRIEVAL_K,
+    RETRIEVAL_MODE,
+    RETRIEVAL_APPROXIMATE_MIN_CHUNKS,
+    RETRIEVAL_N_PROBE,
+    VECTOR_STORAGE_DTYPE,
+)
+
+VECTOR_DTYPES = ("int8", "float16", "float32")
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first, without a full sort."""
+    k = min(k, scores.shape[-1])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < scores.shape[-1]:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.shape[-1])
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class QuantizedVectors:
+    """
+    L2-normalised embedding rows in compact form: int8 codes with a float32
+    scale per row (a quarter of the float32 size), float16, or plain float32.
+    Rows are widened to float32 a block at a time while scoring, so the full
+    precision matrix never has to be resident. Indexing returns float32 rows.
+    NumPy widens float16 slowly, so int8 is both smaller and faster to score.
+    """
+
+    # Small blocks keep the widened rows in cache while they are multiplied
+    BLOCK_ROWS = 256
+
+    def __init__(self, codes: np.ndarray, scales: Optional[np.ndarray] = None):
+        self.codes = codes
+        self.scales = scales
+
+    @classmethod
+    def from_vectors(cls, vectors, dtype: str = VECTOR_STORAGE_DTYPE) -> "QuantizedVectors":
+        if dtype not in VECTOR_DTYPES:
+            raise ValueError(f"Unsupported vector dtype {dtype!r}, expected one of {VECTOR_DTYPES}")
+        matrix = normalize_rows(vectors)
+        if dtype != "int8":
+            return cls(matrix.astype(dtype))
+        # Symmetric per-row quantisation: the largest component maps to +/-127
+        scales = np.abs(matrix).max(axis=1) / 127 if matrix.size else np.ones(len(matrix), np.float32)
+        scales[scales == 0] = 1.0
+        codes = np.rint(matrix / scales[:, None]).astype(np.int8)
+        return cls(codes, scales.astype(np.float32))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, indices) -> np.ndarray:
+        return self.rows(indices)
+
+    @property
+    def dtype(self) -> str:
+        return self.codes.dtype.name
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def rows(self, indices: Union[Sequence[int], np.ndarray, slice, None] = None) -> np.ndarray:
+        """Dequantised float32 rows (all of them if `indices` is None)."""
+        selector = slice(None) if indices is None else indices
+        rows = np.asarray(self.codes[selector], dtype=np.float32)
+        if self.scales is not None:
+            rows *= self.scales[selector][:, None]
+        return rows
+
+    def scores(self, queries: np.ndarray, candidates: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Dot products of one normalised query (dim,) or several (m, dim) with
+        every row, or only the `candidates` rows: shape (rows,) or (m, rows).
+        """
+        if candidates is not None:
+            return queries @ self.rows(candidates).T
+        if self.scales is None and self.codes.dtype == np.float32:
+            return queries @ self.codes.T
+        scores = np.empty(queries.shape[:-1] + (len(self),), dtype=np.float32)
+        for start in range(0, len(self), self.BLOCK_ROWS):
+            block = slice(start, start + self.BLOCK_ROWS)
+            scores[..., block] = queries @ np.asarray(self.codes[block], dtype=np.float32).T
+        # Scaling the scores is cheaper than scaling every widened row
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+
+class VectorIndex:
+    """
+    Cosine-similarity index over a document's chunks. Embeddings are kept
+    L2-normalised in one contiguous (optionally quantised) matrix, so scoring
+    a query is a single matrix-vector product followed by argpartition for
+    the top k. `vectors` may already be a QuantizedVectors (e.g. a ChunkStore's).
+
+    In "approximate" mode (for very large corpora) the rows are clustered
+    with k-means and a query only scores the chunks in its `n_probe` closest
+    clusters, IVF style. Clustering is slow, so pass the `clusters` of an
+    earlier build ((centroids, labels), see `clusters`) to reuse them.
+    """
+
+    def __init__(
+        self,
+        vectors,
+        chunks: List[Document],
+        embeddings=None,
+        mode: str = RETRIEVAL_MODE,
+        n_probe: int = RETRIEVAL_N_PROBE,
+        dtype: str = VECTOR_STORAGE_DTYPE,
+        clusters: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+    ):
+        self.chunks = chunks
+        self.embeddings = embeddings
+        if not isinstance(vectors, QuantizedVectors):
+            vectors = np.asarray(vectors, dtype=np.float32)
+            vectors = QuantizedVectors.from_vectors(
+                vectors.reshape(len(chunks), -1) if len(chunks) else np.empty((0, 0), np.float32), dtype
+            )
+        self.vectors = vectors
+        # A ChunkStore keeps page numbers in its metadata records already
+        pages = getattr(chunks, "pages", None)
+        if pages is None:
+            pages = np.array([chunk.metadata.get("page", -1) for chunk in chunks], dtype=np.int64)
+        self.pages = pages
+        self.n_probe = n_probe
+        self.centroids: Optional[np.ndarray] = None
+        self.labels: Optional[np.ndarray] = None
+        self.lists: List[np.ndarray] = []
+        if mode == "approximate" and len(chunks) >= RETRIEVAL_APPROXIMATE_MIN_CHUNKS:
+            if clusters is not None and self._fits(*clusters):
+                self._set_clusters(*clusters)
+            else:
+                self._build_clusters()
+
+    def __len__(self):
+        return len(self.chunks)
+
+    @property
+    def approximate(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def clusters(self) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(centroids, cluster label per row), or None for an exact index."""
+        return None if self.centroids is None else (self.centroids, self.labels)
+
+    def _fits(self, centroids: np.ndarray, labels: np.ndarray) -> bool:
+        # Saved clusters only apply to the rows (and embedding size) they were built from
+        return (
+            len(labels) == len(self.chunks)
+            and centroids.ndim == 2
+            and len(centroids) > 0
+            and centroids.shape[1] == self.vectors.codes.shape[1]
+            and (not len(labels) or 0 <= labels.min() and labels.max() < len(centroids))
+        )
+
+    def _set_clusters(self, centroids: np.ndarray, labels: np.ndarray):
+        self.centroids = centroids
+        self.labels = labels
+        self.lists = [np.flatnonzero(labels == cluster) for cluster in range(len(centroids))]
+
+    def _build_clusters(self):
+        from sklearn.cluster import MiniBatchKMeans
+
+        n_clusters = max(1, int(np.sqrt(len(self.chunks))))
+        kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=0, n_init=3).fit(self.vectors.rows())
+        self._set_clusters(normalize_rows(kmeans.cluster_centers_), kmeans.labels_.astype(np.int32))
+
+    def _candidates(self, query: np.ndarray, pages: Optional[Iterable[int]]) -> Optional[np.ndarray]:
+        # None means "score every row"
+        candidates = None
+        if self.approximate:
+            probe = top_k(self.centroids @ query, self.n_probe)
+            candidates = np.concatenate([self.lists[cluster] for cluster in probe])
+        if pages is not None:
+            page_mask = np.isin(self.pages, np.fromiter(pages, dtype=np.int64))
+            allowed = np.flatnonzero(page_mask)
+            candidates = allowed if candidates is None else np.intersect1d(candidates, allowed)
+        return candidates
+
+    def search_by_vector(self, query, k: int = RETRIEVAL_K, pages: Optional[Iterable[int]] = None) -> List[Tuple[int, float]]:
+        """Return (chunk index, cosine score) pairs, best first."""
+        if not len(self.chunks):
+            return []
+        query = normalize_rows(np.asarray(query, dtype=np.float32))
+        candidates = self._candidates(query, pages)
+        scores = self.vectors.scores(query, candidates)
+        best = top_k(scores, k)
+        if candidates is None:
+            return [(int(i), float(scores[i])) for i in best]
+        return [(int(candidates[i]), float(scores[i])) for i in best]
+
+    def search_many(self, queries, k: int = RETRIEVAL_K) -> List[List[Tuple[int, float]]]:
+        """Top k for several query vectors at once with one matrix product."""
+        queries = normalize_rows(np.asarray(queries, dtype=np.float32))
+        if not len(self.chunks) or not len(queries):
+            return [[] for _ in range(len(queries))]
+        if self.approximate:
+            return [self.search_by_vector(query, k) for query in queries]
+        scores = self.vectors.scores(queries)
+        return [[(int(i), float(row[i])) for i in top_k(row, k)] for row in scores]
+
+    def similarity_search(self, query: str, k: int = RETRIEVAL_K, pages: Optional[Iterable[int]] = None) -> List[Document]:
+        query_vector = self.embeddings.embed_query(query)
+        return [self.chunks[i] for i, _ in self.search_by_vector(query_vector, k, pages)]
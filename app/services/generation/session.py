@@ -0,0 +1,183 @@
+# app/services/generation/session.py
+
+import asyncio
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_core.documents import Document
+from langgraph.graph import START, StateGraph
+from typing_extensions import TypedDict
+
+from app.core.metrics import timer, llm_calls, llm_tokens
+from app.core.config import MAX_DOCUMENT_SESSIONS, RETRIEVAL_K, CONTEXT_PACKING, CONTEXT_FETCH_K
+from app.services.generation.registry import ModelRegistry
+from app.services.generation.concurrency import run_blocking
+from app.services.generation.embedding_cache import embed_queries
+from app.services.generation.retrieval import VectorIndex, normalize_rows
+from app.services.generation.chunk_store import ChunkStore
+from app.services.generation.context import pack_context
+from app.services.generation.ingest import ProgressCallback, ingest_chunks
+from app.services.generation.upload import PdfSource, hash_source
+
+
+class State(TypedDict):
+    question: str
+    context: List[Document]
+    answer: str
+    tokens: int
+    context_report: dict
+
+
+class DocumentSession:
+    """
+    A document that has been ingested exactly once: its chunks and their
+    quantised embeddings (a ChunkStore, searched through a VectorIndex) and
+    the compiled retrieve -> generate graph. Every generation step queries
+    the session instead of re-parsing and re-embedding the PDF. Building the
+    index may cluster the embeddings, so construct sessions via run_blocking.
+    """
+
+    def __init__(self, document_id: str, chunks: ChunkStore, registry: ModelRegistry):
+        self.document_id = document_id
+        self.chunks = chunks
+        self.registry = registry
+        self.index = VectorIndex(chunks.vectors, chunks, embeddings=registry.embeddings, clusters=chunks.clusters)
+        # Keep the clusters with the chunks, so a saved store reloads without re-clustering
+        if self.index.clusters is not None:
+            chunks.clusters = self.index.clusters
+        self.graph = self._build_graph()
+
+    def _assemble(self, query_vector, hits: List[Tuple[int, float]]) -> Tuple[List[Document], dict]:
+        if not CONTEXT_PACKING:
+            return [self.chunks[i] for i, _ in hits[:RETRIEVAL_K]], {}
+        query = normalize_rows(np.asarray(query_vector, dtype=np.float32))
+        return pack_context(query, hits, self.chunks, self.index.vectors)
+
+    def _fetch_k(self) -> int:
+        return CONTEXT_FETCH_K if CONTEXT_PACKING else RETRIEVAL_K
+
+    def retrieve_context(self, question: str) -> Tuple[List[Document], dict]:
+        """
+        Retrieve and pack the context for one question. Returns the chunks to
+        put in the prompt and the packing report (tokens saved etc.).
+        """
+        with timer("retrieve"):
+            query_vector = self.registry.embeddings.embed_query(question)
+            hits = self.index.search_by_vector(query_vector, self._fetch_k())
+            return self._assemble(query_vector, hits)
+
+    async def retrieve_many(self, questions: List[str]) -> List[Tuple[List[Document], dict]]:
+        """
+        Retrieve context for several questions with one batch of query
+        embeddings and one matrix product against the index.
+        """
+        embeddings = self.registry.embeddings
+
+        def search():
+            query_vectors = embed_queries(embeddings, questions)
+            hits = self.index.search_many(query_vectors, self._fetch_k())
+            return [self._assemble(vector, question_hits) for vector, question_hits in zip(query_vectors, hits)]
+
+        with timer("retrieve"):
+            return await run_blocking(search)
+
+    async def answer(self, question: str, context: List[Document]) -> Tuple[str, int]:
+        """Ask the chat model `question` over `context`; returns (answer, tokens)."""
+        docs_content = '\n\n'.join([doc.page_content for doc in context])
+        # Format the input as a string
+        formatted_input = f"Question: {question}\n\nContext:\n{docs_content}"
+        with timer("llm"):
+            response = await self.registry.llm.ainvoke(formatted_input)  # Pass the formatted string
+        tokens_in, tokens_out = token_usage(response, formatted_input)
+        llm_calls.inc()
+        llm_tokens.inc(tokens_in, direction="in")
+        llm_tokens.inc(tokens_out, direction="out")
+        return response.content.strip(), tokens_in + tokens_out
+
+    def _build_graph(self):
+        async def retrieve(state: State):
+            # Query embedding and scoring are CPU-bound, keep them off the event loop
+            state["context"], state["context_report"] = await run_blocking(self.retrieve_context, state["question"])
+            return state
+
+        async def generate(state: State):
+            state["answer"], state["tokens"] = await self.answer(state["question"], state["context"])
+            return state  # Return the updated state as a dict
+
+        graph_builder = StateGraph(State).add_sequence([retrieve, generate])
+        graph_builder.add_edge(START, "retrieve")
+        return graph_builder.compile()
+
+
+def token_usage(response, prompt: str) -> Tuple[int, int]:
+    # Prefer the provider's usage report; fall back to ~4 characters per token
+    usage = getattr(response, "usage_metadata", None)
+    if usage and usage.get("total_tokens"):
+        return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    return len(prompt) // 4, len(response.content) // 4
+
+
+async def load_pdf_pages(file_path: str) -> List[Document]:
+    loader = PyPDFLoader(file_path)
+    pages = []
+    async for page in loader.alazy_load():
+        pages.append(page)
+    return pages
+
+
+# Most recently used sessions, keyed by the SHA-256 of the PDF bytes
+_sessions: "OrderedDict[str, DocumentSession]" = OrderedDict()
+_ingest_locks: Dict[str, asyncio.Lock] = {}
+
+
+def remember_session(session: DocumentSession) -> None:
+    _sessions[session.document_id] = session
+    _sessions.move_to_end(session.document_id)
+    while len(_sessions) > MAX_DOCUMENT_SESSIONS:
+        _sessions.popitem(last=False)
+
+
+def get_cached_session(document_id: str):
+    session = _sessions.get(document_id)
+    if session is not None:
+        _sessions.move_to_end(document_id)
+    return session
+
+
+async def ingest_document(
+    source: PdfSource,
+    registry: ModelRegistry,
+    document_id: str = None,
+    on_progress: Optional[ProgressCallback] = None,
+    name: Optional[str] = None,
+    on_ingested: Optional[Callable[[DocumentSession, np.ndarray], Awaitable[None]]] = None,
+) -> DocumentSession:
+    """
+    Parse, split and embed a PDF (its bytes or a file path) once. Ingesting a
+    byte-identical document again returns the existing session without doing
+    any work. `on_ingested(session, vectors)` (e.g. persisting the session
+    with its full-precision float32 embeddings) is awaited only by the call
+    that actually did the ingest, while it still holds the document's lock,
+    so concurrent callers never repeat it.
+    """
+    document_id = document_id or await run_blocking(hash_source, source)
+    session = get_cached_session(document_id)
+    if session is not None:
+        return session
+
+    # Concurrent requests for the same document wait for a single ingest
+    lock = _ingest_locks.setdefault(document_id, asyncio.Lock())
+    async with lock:
+        session = get_cached_session(document_id)
+        if session is None:
+            chunks, vectors = await ingest_chunks(source, registry, on_progress=on_progress, name=name)
+            vectors = np.asarray(vectors, dtype=np.float32)
+            store = await run_blocking(ChunkStore.from_documents, chunks, vectors)
+            session = await run_blocking(DocumentSession, document_id, store, registry)
+            if on_ingested is not None:
+                await on_ingested(session, vectors)
+            remember_session(session)
+    _ingest_locks.pop(document_id, None)
+    return session
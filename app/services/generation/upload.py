@@ -0,0 +1,101 @@
+# app/services/generation/upload.py
+
+import hashlib
+import os
+import tempfile
+from typing import Union
+
+from app.core.config import MAX_UPLOAD_BYTES, UPLOAD_SPILL_BYTES, UPLOAD_CHUNK_BYTES
+from app.core.metrics import timer
+from app.services.generation.concurrency import run_blocking
+
+# What the ingest pipeline reads a PDF from: its bytes, or the path of a file on disk
+PdfSource = Union[bytes, str]
+
+
+class UploadTooLargeError(ValueError):
+    pass
+
+
+class UploadedDocument:
+    """
+    A received PDF: its SHA-256 (the document ID), and its bytes, held in
+    memory or, above the spill threshold, in a temp file. Call close() when
+    done to remove the temp file.
+    """
+
+    def __init__(self, document_id: str, size: int, filename: str = None, data: bytes = None, path: str = None):
+        self.document_id = document_id
+        self.size = size
+        self.filename = filename
+        self.data = data
+        self.path = path
+
+    @property
+    def source(self) -> PdfSource:
+        return self.data if self.data is not None else self.path
+
+    def close(self) -> None:
+        self.data = None
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+        self.path = None
+
+
+async def receive_upload(
+    upload,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    spill_bytes: int = UPLOAD_SPILL_BYTES,
+    chunk_size: int = UPLOAD_CHUNK_BYTES,
+) -> UploadedDocument:
+    """
+    Read an UploadFile chunk by chunk without blocking the event loop, hashing
+    as it goes. Small files stay in memory; once more than `spill_bytes` have
+    arrived the rest goes straight to a temp file. Raises UploadTooLargeError
+    as soon as the file is known to exceed `max_bytes`.
+    """
+    if upload.size is not None and upload.size > max_bytes:
+        raise UploadTooLargeError(f"File is larger than {max_bytes} bytes")
+
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    spill_file = None
+    size = 0
+    try:
+        with timer("upload_receive"):
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(f"File is larger than {max_bytes} bytes")
+                digest.update(chunk)
+                if spill_file is None and size > spill_bytes:
+                    spill_file = tempfile.NamedTemporaryFile(delete=False)
+                    await run_blocking(spill_file.write, bytes(buffer))
+                    buffer = bytearray()
+                if spill_file is not None:
+                    await run_blocking(spill_file.write, chunk)
+                else:
+                    buffer += chunk
+    except BaseException:
+        if spill_file is not None:
+            spill_file.close()
+            os.remove(spill_file.name)
+        raise
+
+    if spill_file is None:
+        return UploadedDocument(digest.hexdigest(), size, upload.filename, data=bytes(buffer))
+    spill_file.close()
+    return UploadedDocument(digest.hexdigest(), size, upload.filename, path=spill_file.name)
+
+
+def hash_source(source: PdfSource) -> str:
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(source).hexdigest()
+    digest = hashlib.sha256()
+    with open(source, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,75 @@
+# benchmarks/bench_import.py
+#
+# Cold import time of app modules, each measured in a fresh interpreter, and
+# which heavy libraries the import drags in. `app.main` should stay well under
+# a second and load none of the generation stack.
+#
+#   python -m benchmarks.bench_import --repeats 5
+#   python -m benchmarks.bench_import --module app.main app.services.generation.generate
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = [
+    "torch",
+    "transformers",
+    "sentence_transformers",
+    "sklearn",
+    "langchain",
+    "langchain_core",
+    "langchain_community",
+    "langchain_huggingface",
+    "langgraph",
+    "pypdf",
+    "PyPDF2",
+    "numpy",
+]
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - started
+print(json.dumps({{"seconds": seconds, "loaded": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def measure(module: str, repeats: int) -> dict:
+    samples, loaded = [], []
+    env = dict(os.environ, WARMUP_MODELS="false")
+    for _ in range(repeats):
+        output = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=REPO_ROOT,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        samples.append(result["seconds"] * 1000)
+        loaded = result["loaded"]
+    return {
+        "min_ms": min(samples),
+        "median_ms": statistics.median(samples),
+        "max_ms": max(samples),
+        "heavy_modules_loaded": loaded,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold import time of app modules")
+    parser.add_argument("--module", nargs="+", default=["app.main", "app.services.generation.generate"])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps({module: measure(module, args.repeats) for module in args.module}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
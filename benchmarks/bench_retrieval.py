@@ -0,0 +1,77 @@
+# benchmarks/bench_retrieval.py
+#
+# Recall and latency of VectorIndex (exact and approximate) against LangChain's
+# InMemoryVectorStore on synthetic embeddings.
+#
+#   python -m benchmarks.bench_retrieval --chunks 2000 5000 20000 --queries 50
+
+import argparse
+import json
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import InMemoryVectorStore
+
+from app.services.generation.retrieval import VectorIndex
+from benchmarks.fakes import HashEmbeddings
+
+
+def clustered_vectors(n: int, dim: int, rng: np.random.Generator) -> np.ndarray:
+    # Real chunk embeddings are clustered by topic, uniform noise would flatter IVF
+    centers = rng.normal(size=(max(1, n // 50), dim))
+    vectors = centers[rng.integers(0, len(centers), n)] + 0.3 * rng.normal(size=(n, dim))
+    return vectors.astype(np.float32)
+
+
+def timed(fn, queries):
+    results, started = [], time.perf_counter()
+    for query in queries:
+        results.append(fn(query))
+    return results, (time.perf_counter() - started) * 1000 / len(queries)
+
+
+def run(n_chunks: int, n_queries: int, dim: int, k: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    vectors = clustered_vectors(n_chunks, dim, rng)
+    queries = vectors[rng.integers(0, n_chunks, n_queries)] + 0.1 * rng.normal(size=(n_queries, dim))
+    chunks = [Document(page_content=str(i), metadata={"page": i // 10}) for i in range(n_chunks)]
+
+    # Searches go through *_by_vector; the embedder only has to match the vectors' size
+    store = InMemoryVectorStore(embedding=HashEmbeddings(dim=dim))
+    for i, (chunk, vector) in enumerate(zip(chunks, vectors)):
+        store.store[str(i)] = {"id": str(i), "vector": vector.tolist(), "text": chunk.page_content, "metadata": chunk.metadata}
+    baseline, baseline_ms = timed(
+        lambda q: [int(doc.page_content) for doc in store.similarity_search_by_vector(q.tolist(), k=k)], queries
+    )
+
+    report = {"chunks": n_chunks, "queries": n_queries, "dim": dim, "k": k,
+              "in_memory_vector_store": {"ms_per_query": baseline_ms}}
+    for mode in ("exact", "approximate"):
+        started = time.perf_counter()
+        index = VectorIndex(vectors, chunks, mode=mode)
+        build_ms = (time.perf_counter() - started) * 1000
+        found, ms = timed(lambda q: [i for i, _ in index.search_by_vector(q, k)], queries)
+        recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(found, baseline)])
+        report[f"vector_index_{mode}"] = {
+            "ms_per_query": ms,
+            "build_ms": build_ms,
+            "recall_at_k": float(recall),
+            "clustered": index.approximate,
+            "speedup": baseline_ms / ms if ms else None,
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--k", type=int, default=4)
+    args = parser.parse_args()
+    print(json.dumps([run(n, args.queries, args.dim, args.k) for n in args.chunks], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# benchmarks/bench_storage.py
+#
+# Memory footprint and recall of the compact ChunkStore (int8 / float16 /
+# float32 vectors) against LangChain's InMemoryVectorStore holding the same
+# chunks, on synthetic embeddings and text. "loaded" is the store memory-mapped
+# back from disk: its heap cost is what stays resident per warm document.
+#
+#   python -m benchmarks.bench_storage --chunks 1000 10000 --queries 50
+
+import argparse
+import gc
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import InMemoryVectorStore
+
+from app.services.generation.chunk_store import ChunkStore
+from app.services.generation.retrieval import VECTOR_DTYPES, VectorIndex
+from benchmarks.bench_retrieval import clustered_vectors
+from benchmarks.fakes import HashEmbeddings
+
+WORDS = "the of and to in is that for it as with was on be by this are from at or an which".split()
+
+
+def synthetic_chunks(n: int, chunk_chars: int, rng: np.random.Generator):
+    texts, metadatas = [], []
+    for i in range(n):
+        words = rng.choice(WORDS, size=chunk_chars // 4)
+        texts.append(" ".join(words)[:chunk_chars])
+        page = i // 4
+        metadatas.append({"source": "bench.pdf", "page": page, "page_label": str(page + 1),
+                          "total_pages": n // 4 + 1, "start_index": (i % 4) * 800})
+    return texts, metadatas
+
+
+def heap_bytes(build):
+    """Heap allocated (and still held) by build(); numpy buffers are traced too."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def timed(fn, queries):
+    results, started = [], time.perf_counter()
+    for query in queries:
+        results.append(fn(query))
+    return results, (time.perf_counter() - started) * 1000 / len(queries)
+
+
+def run(n_chunks: int, n_queries: int, dim: int, k: int, chunk_chars: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    vectors = clustered_vectors(n_chunks, dim, rng)
+    queries = vectors[rng.integers(0, n_chunks, n_queries)] + 0.1 * rng.normal(size=(n_queries, dim))
+    texts, metadatas = synthetic_chunks(n_chunks, chunk_chars, rng)
+
+    def build_baseline():
+        # What add_documents leaves behind: Documents plus a float list per vector
+        store = InMemoryVectorStore(embedding=HashEmbeddings(dim=dim))
+        for i, (text, metadata, vector) in enumerate(zip(texts, metadatas, vectors)):
+            document = Document(page_content=text, metadata=dict(metadata))
+            store.store[str(i)] = {"id": str(i), "vector": vector.tolist(), "text": document.page_content,
+                                   "metadata": document.metadata}
+        return store
+
+    store, baseline_bytes = heap_bytes(build_baseline)
+    baseline, baseline_ms = timed(
+        lambda q: [int(doc.id) for doc in store.similarity_search_by_vector(q.tolist(), k=k)], queries
+    )
+    del store
+
+    report = {"chunks": n_chunks, "dim": dim, "k": k, "chunk_chars": chunk_chars,
+              "in_memory_vector_store": {"heap_mb": baseline_bytes / 1e6, "ms_per_query": baseline_ms}}
+    with tempfile.TemporaryDirectory() as directory:
+        for dtype in VECTOR_DTYPES:
+            chunks, heap = heap_bytes(lambda: ChunkStore.from_texts(texts, metadatas, vectors, dtype))
+            path = os.path.join(directory, f"{dtype}.chunks")
+            chunks.save(path)
+            del chunks
+
+            started = time.perf_counter()
+            loaded, loaded_heap = heap_bytes(lambda: ChunkStore.load(path))
+            load_ms = (time.perf_counter() - started) * 1000
+            index = VectorIndex(loaded.vectors, loaded, mode="exact")
+            found, ms = timed(lambda q: [i for i, _ in index.search_by_vector(q, k)], queries)
+            recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(found, baseline)])
+            report[f"chunk_store_{dtype}"] = {
+                "heap_mb": heap / 1e6,
+                "loaded_heap_mb": loaded_heap / 1e6,
+                "file_mb": os.path.getsize(path) / 1e6,
+                "load_ms": load_ms,
+                "ms_per_query": ms,
+                "recall_at_k": float(recall),
+                "memory_ratio": baseline_bytes / heap if heap else None,
+            }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory and recall of ChunkStore against InMemoryVectorStore")
+    parser.add_argument("--chunks", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--chunk-chars", type=int, default=1000)
+    args = parser.parse_args()
+    print(json.dumps([run(n, args.queries, args.dim, args.k, args.chunk_chars) for n in args.chunks], indent=2))
+
+
+if __name__ == "__main__":
+    main()
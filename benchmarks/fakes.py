@@ -0,0 +1,300 @@
+# benchmarks/fakes.py
+#
+# Deterministic local stand-ins for the external pieces of the pipeline, so the
+# benchmarks run without HuggingFace weights, a Groq key, LangSmith or MongoDB.
+
+import asyncio
+import copy
+import hashlib
+import itertools
+import json
+import time
+from typing import AsyncIterator, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pymongo.errors import DuplicateKeyError
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Embeds text as a normalised vector seeded from its SHA-256, so the same
+    text always maps to the same vector. `cost_ms` simulates model time per text.
+    """
+
+    def __init__(self, dim: int = 768, cost_ms: float = 0.0):
+        self.dim = dim
+        self.cost_ms = cost_ms
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.cost_ms:
+            time.sleep(self.cost_ms * len(texts) / 1000)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def canned_answer(prompt: str) -> str:
+    # Answers shaped like what each GenerationService prompt expects
+    question = prompt.split("\n\nContext:", 1)[0]
+    if "JSON array" in question:
+        return json.dumps([
+            {"key_concept": name, "description": f"What {name.lower()} means in this document."}
+            for name in ("Narrative structure", "Fabula and syuzhet", "Story events")
+        ])
+    if "key points" in question:
+        return "Key points\n\nNarrative structure: How the story is told\nFabula: The story's events\nSyuzhet: Their ordering"
+    if "quiz" in question or "flashcards" in question:
+        return "\n\n".join(f"Question {i}: Answer {i} drawn from the document." for i in range(1, 4))
+    return "This document discusses narrative structure. " * 20
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model returning canned_answer() for each prompt. `latency` is added
+    before the first token and `token_latency` between streamed tokens, to
+    imitate a remote LLM.
+    """
+
+    latency: float = 0.0
+    token_latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-benchmark-chat"
+
+    def _message(self, messages: List[BaseMessage]) -> AIMessage:
+        prompt = "\n".join(str(message.content) for message in messages)
+        answer = canned_answer(prompt)
+        input_tokens, output_tokens = len(prompt) // 4, len(answer) // 4
+        return AIMessage(
+            content=answer,
+            usage_metadata={"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens},
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency)
+        for token in self._message(messages).content.split(" "):
+            time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token + " "))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency)
+        for token in self._message(messages).content.split(" "):
+            await asyncio.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token + " "))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+# -- in-memory stand-in for the Motor database ------------------------------
+
+_object_ids = itertools.count()
+
+
+def _lookup(document: dict, dotted: str):
+    for part in dotted.split("."):
+        document = document.get(part) if isinstance(document, dict) else None
+    return document
+
+
+def _matches(document: dict, query: dict) -> bool:
+    for field, condition in (query or {}).items():
+        value = _lookup(document, field)
+        if isinstance(condition, dict) and condition and all(op.startswith("$") for op in condition):
+            for op, operand in condition.items():
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$gt" and not (value is not None and value > operand):
+                    return False
+                if op == "$lt" and not (value is not None and value < operand):
+                    return False
+                if op == "$gte" and not (value is not None and value >= operand):
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _project(document: dict, projection: Optional[dict]) -> dict:
+    document = copy.deepcopy(document)
+    if not projection:
+        return document
+    if any(projection.values()):
+        keep = {field for field, on in projection.items() if on}
+        if projection.get("_id", 1):
+            keep.add("_id")
+        return {field: value for field, value in document.items() if field in keep}
+    return {field: value for field, value in document.items() if projection.get(field, 1)}
+
+
+class _UpdateResult:
+    def __init__(self, matched_count: int, upserted_id=None):
+        self.matched_count = matched_count
+        self.modified_count = matched_count
+        self.upserted_id = upserted_id
+
+
+class FakeCursor:
+    # Like Mongo, sorts on the stored documents and applies the projection last
+    def __init__(self, documents: List[dict], projection: Optional[dict] = None):
+        self.documents = documents
+        self.projection = projection
+
+    def sort(self, field, direction: int = 1):
+        self.documents.sort(key=lambda document: _lookup(document, field), reverse=direction < 0)
+        return self
+
+    def limit(self, count: int):
+        self.documents = self.documents[:count] if count else self.documents
+        return self
+
+    def __aiter__(self):
+        self._iterator = (_project(document, self.projection) for document in self.documents)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def to_list(self, length: Optional[int] = None):
+        documents = self.documents[:length] if length else self.documents
+        return [_project(document, self.projection) for document in documents]
+
+
+class FakeCollection:
+    def __init__(self):
+        self.documents: List[dict] = []
+        self.unique_keys: List[tuple] = []  # (fields, partial filter or None)
+
+    async def create_index(self, keys, unique: bool = False, **kwargs):
+        fields = (keys,) if isinstance(keys, str) else tuple(field for field, _ in keys)
+        if unique:
+            self.unique_keys.append((fields, kwargs.get("partialFilterExpression")))
+        return kwargs.get("name") or "_".join(f"{field}_1" for field in fields)
+
+    def _check_unique(self, document: dict, ignore: Optional[dict] = None):
+        for existing in self.documents:
+            if existing is ignore:
+                continue
+            if existing["_id"] == document["_id"]:
+                raise DuplicateKeyError("duplicate key: _id")
+            for fields, partial in self.unique_keys:
+                if partial and not (_matches(document, partial) and _matches(existing, partial)):
+                    continue
+                if all(field in document and existing.get(field) == document[field] for field in fields):
+                    raise DuplicateKeyError(f"duplicate key: {', '.join(fields)}")
+
+    async def insert_one(self, document: dict):
+        document.setdefault("_id", next(_object_ids))
+        self._check_unique(document)
+        self.documents.append(copy.deepcopy(document))
+
+    async def insert_many(self, documents: List[dict], ordered: bool = True):
+        for document in documents:
+            await self.insert_one(document)
+
+    async def find_one(self, query: Optional[dict] = None, projection: Optional[dict] = None, **kwargs):
+        for document in self.documents:
+            if _matches(document, query):
+                return _project(document, projection)
+        return None
+
+    def find(self, query: Optional[dict] = None, projection: Optional[dict] = None, **kwargs) -> FakeCursor:
+        return FakeCursor([document for document in self.documents if _matches(document, query)], projection)
+
+    async def count_documents(self, query: dict) -> int:
+        return sum(1 for document in self.documents if _matches(document, query))
+
+    async def delete_many(self, query: dict):
+        self.documents = [document for document in self.documents if not _matches(document, query)]
+
+    async def delete_one(self, query: dict):
+        for document in self.documents:
+            if _matches(document, query):
+                self.documents.remove(document)
+                return
+
+    def _apply(self, document: dict, update: dict, inserting: bool):
+        for field, value in update.get("$set", {}).items():
+            document[field] = copy.deepcopy(value)
+        for field, value in update.get("$inc", {}).items():
+            document[field] = document.get(field, 0) + value
+        if inserting:
+            for field, value in update.get("$setOnInsert", {}).items():
+                document[field] = copy.deepcopy(value)
+
+    async def update_one(self, query: dict, update: dict, upsert: bool = False):
+        for document in self.documents:
+            if _matches(document, query):
+                self._apply(document, update, inserting=False)
+                return _UpdateResult(1)
+        if upsert:
+            document = {field: value for field, value in query.items() if not isinstance(value, dict)}
+            self._apply(document, update, inserting=True)
+            document.setdefault("_id", next(_object_ids))
+            self._check_unique(document)
+            self.documents.append(document)
+            return _UpdateResult(0, document["_id"])
+        return _UpdateResult(0)
+
+    async def bulk_write(self, requests, ordered: bool = True):
+        # Only the ReplaceOne requests the app issues
+        for request in requests:
+            await self.replace_one(request._filter, request._doc, upsert=request._upsert)
+
+    async def update_many(self, query: dict, update: dict):
+        matched = [document for document in self.documents if _matches(document, query)]
+        for document in matched:
+            self._apply(document, update, inserting=False)
+        return _UpdateResult(len(matched))
+
+    async def replace_one(self, query: dict, replacement: dict, upsert: bool = False):
+        for position, document in enumerate(self.documents):
+            if _matches(document, query):
+                self.documents[position] = copy.deepcopy(replacement)
+                return _UpdateResult(1)
+        if upsert:
+            await self.insert_one(copy.deepcopy(replacement))
+            return _UpdateResult(0, replacement.get("_id"))
+        return _UpdateResult(0)
+
+
+class FakeDatabase:
+    """Just enough of AsyncIOMotorDatabase for the app: attribute access to collections."""
+
+    def __init__(self):
+        self._collections = {}
+
+    def __getattr__(self, name: str) -> FakeCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self._collections.setdefault(name, FakeCollection())
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        return getattr(self, name)
+
+    async def command(self, *args, **kwargs):
+        return {"ok": 1}
@@ -0,0 +1,283 @@
+# benchmarks/run.py
+#
+# Offline benchmark / load test of the generation pipeline. External services
+# are replaced by the deterministic fakes in benchmarks/fakes.py, so results
+# only reflect our own code plus the injected latencies.
+#
+# Requests go through httpx's in-process ASGI transport, which buffers each
+# response, so time_to_first_byte equals total latency here even for the SSE
+# endpoints; it becomes meaningful once the transport streams.
+#
+#   python -m benchmarks.run --output bench.json
+#   python -m benchmarks.run --llm-latency 0.5 --concurrency 32 --requests 128
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentiles(samples_ms):
+    if not samples_ms:
+        return {}
+    ordered = sorted(samples_ms)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered),
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "max_ms": ordered[-1],
+    }
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def configure(args):
+    """Point the app at the fakes. Must run before anything under app/ is imported."""
+    os.environ["WARMUP_MODELS"] = "false"
+    os.environ["EMBEDDING_CACHE_DIR"] = ""
+    os.environ["DOCUMENT_STORE_DIR"] = ""
+    os.environ["LANGSMITH_TRACING"] = "false"
+    os.environ["RESULT_CACHE_ENABLED"] = "true" if args.result_cache else "false"
+
+    from benchmarks.fakes import FakeChatModel, FakeDatabase, HashEmbeddings
+    import app.db.database as database
+    database.db = FakeDatabase()
+
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    from app.core.config import CHUNK_SIZE, CHUNK_OVERLAP
+    from app.services.generation.registry import ModelRegistry, set_model_registry
+
+    registry = ModelRegistry(
+        embeddings=HashEmbeddings(dim=args.dim, cost_ms=args.embed_cost_ms),
+        llm=FakeChatModel(latency=args.llm_latency, token_latency=args.token_latency),
+        text_splitter=RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, add_start_index=True),
+        prompt=ChatPromptTemplate.from_template("{question}"),
+    )
+    set_model_registry(registry)
+    return registry
+
+
+async def bench_ingest(registry, pdf_path: str, repeats: int) -> dict:
+    from app.services.generation import session as sessions
+
+    runs = []
+    for repeat in range(repeats):
+        sessions._sessions.clear()
+        started = time.perf_counter()
+        first_embedding = []
+
+        async def on_progress(progress):
+            if progress["chunks_embedded"] and not first_embedding:
+                first_embedding.append(time.perf_counter() - started)
+
+        session = await sessions.ingest_document(pdf_path, registry, document_id=f"bench-{repeat}", on_progress=on_progress)
+        elapsed = time.perf_counter() - started
+        pages = session.chunks[0].metadata.get("total_pages", 0) if session.chunks else 0
+        runs.append({
+            "seconds": elapsed,
+            "pages": pages,
+            "chunks": len(session.chunks),
+            "pages_per_s": pages / elapsed,
+            "chunks_per_s": len(session.chunks) / elapsed,
+            "time_to_first_embedding_ms": first_embedding[0] * 1000 if first_embedding else None,
+        })
+    best = min(runs, key=lambda run: run["seconds"])
+    return {"runs": runs, "best": best}
+
+
+async def bench_retrieval(registry, pdf_path: str, queries: int) -> dict:
+    from app.services.generation.session import ingest_document
+
+    session = await ingest_document(pdf_path, registry)
+    samples, saved, dropped = [], [], []
+    for i in range(queries):
+        started = time.perf_counter()
+        _, report = session.retrieve_context(f"benchmark question {i} about the document")
+        samples.append((time.perf_counter() - started) * 1000)
+        saved.append(report.get("tokens_saved", 0))
+        dropped.append(report.get("budget_tokens_dropped", 0))
+    return {
+        "chunks": len(session.chunks),
+        "latency": percentiles(samples),
+        "mean_tokens_saved": statistics.fmean(saved),
+        "mean_tokens_dropped": statistics.fmean(dropped),
+    }
+
+
+async def bench_endpoints(pdf_path: str, requests: int, concurrency: int) -> dict:
+    import httpx
+    from app.main import app
+    from app.services.generation.jobs import get_job_manager
+
+    with open(pdf_path, "rb") as f:
+        pdf = f.read()
+
+    def upload(variant: str = None):
+        # A trailing PDF comment gives each variant its own document ID, so the
+        # upload is really ingested rather than deduplicated; readers ignore it
+        data = pdf if variant is None else pdf + f"\n% bench {variant}\n".encode()
+        return {"files": {"pdf_file": ("bench.pdf", data, "application/pdf")}}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        document_id = (await client.post("/content/documents", **upload())).json()["document_id"]
+        await client.post("/register", json={"username": "bench", "password": "bench-password"})
+
+        async def call(method: str, path: str, **kwargs):
+            """Send one request; returns (status, time of the first body byte, body)."""
+            async with client.stream(method, path, **kwargs) as response:
+                first, body = None, bytearray()
+                async for chunk in response.aiter_raw():
+                    if first is None:
+                        first = time.perf_counter()
+                    body += chunk
+                return response.status_code, first, bytes(body)
+
+        async def send(method: str, path: str, **kwargs):
+            status, first, body = await call(method, path, **kwargs)
+            # SSE endpoints have already answered 200 when they report a failure
+            if b"event: error\n" in body:
+                status = 500
+            return status, first
+
+        async def run_job(i: int):
+            # Submit, then poll until the job finishes; first byte is the job ID coming back
+            status, first, body = await call("POST", "/content/jobs", **upload(f"job {i}"))
+            if status >= 400:
+                return status, first
+            job_id = json.loads(body)["job_id"]
+            while True:
+                status, _, body = await call("GET", f"/content/jobs/{job_id}")
+                job_status = json.loads(body).get("status") if status < 400 else None
+                if job_status not in ("queued", "running"):
+                    return (500 if job_status == "failed" else status), first
+                await asyncio.sleep(0.01)
+
+        concept_form = lambda i: {"data": {"document_id": document_id, "concept": f"concept {i}"}}
+        batch_form = lambda i: {"data": {"document_id": document_id, "concepts": [f"batch {i} concept {j}" for j in range(5)]}}
+        endpoints = {
+            "POST /token": lambda i: send("POST", "/token", data={"username": "bench", "password": "bench-password"}),
+            "POST /content/create": lambda i: send("POST", "/content/create", json={
+                "id": f"bench-{i}", "title": "Bench", "description": "Benchmark content",
+                "associated_with": {"username": "bench"}}),
+            "POST /content/documents": lambda i: send("POST", "/content/documents", **upload(f"document {i}")),
+            "POST /content/documents (duplicate)": lambda i: send("POST", "/content/documents", **upload()),
+            "POST /content/jobs + GET /content/jobs/{id}": run_job,
+            "POST /content/generate_summary": lambda i: send("POST", "/content/generate_summary", **upload()),
+            "POST /content/get_key_concept_details": lambda i: send(
+                "POST", "/content/get_key_concept_details", **concept_form(i)),
+            "POST /content/generate_quizzes": lambda i: send("POST", "/content/generate_quizzes", **concept_form(i)),
+            "POST /content/generate_flashcards": lambda i: send("POST", "/content/generate_flashcards", **concept_form(i)),
+            "POST /content/generate_quizzes/batch": lambda i: send(
+                "POST", "/content/generate_quizzes/batch", **batch_form(i)),
+            "POST /content/generate_flashcards/batch": lambda i: send(
+                "POST", "/content/generate_flashcards/batch", **batch_form(i)),
+            "POST /content/stream/summary": lambda i: send(
+                "POST", "/content/stream/summary", data={"document_id": document_id}),
+            "POST /content/stream/key_concept_details": lambda i: send(
+                "POST", "/content/stream/key_concept_details", **concept_form(i)),
+            "POST /content/stream/quizzes": lambda i: send("POST", "/content/stream/quizzes", **concept_form(i)),
+            "POST /content/stream/flashcards": lambda i: send("POST", "/content/stream/flashcards", **concept_form(i)),
+        }
+
+        # The ASGI transport doesn't run the app's lifespan, which starts the job workers
+        get_job_manager().start()
+        results = {}
+        for name, request in endpoints.items():
+            limit = asyncio.Semaphore(concurrency)
+            latencies, first_bytes, errors = [], [], 0
+
+            async def one(i):
+                nonlocal errors
+                async with limit:
+                    started = time.perf_counter()
+                    status, first = await request(i)
+                    finished = time.perf_counter()
+                if status >= 400:
+                    errors += 1
+                latencies.append((finished - started) * 1000)
+                first_bytes.append(((first or finished) - started) * 1000)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(one(i) for i in range(requests)))
+            wall = time.perf_counter() - started
+            results[name] = {
+                "latency": percentiles(latencies),
+                "time_to_first_byte": percentiles(first_bytes),
+                "requests_per_s": requests / wall,
+                "errors": errors,
+            }
+        await get_job_manager().stop()
+    return results
+
+
+async def run(args) -> dict:
+    registry = configure(args)
+    from app.db.database import ensure_indexes
+    from app.services.generation.concurrency import shutdown_executor, shutdown_process_pool
+
+    # The ASGI transport doesn't run the app's lifespan; create the indexes it would
+    await ensure_indexes()
+
+    try:
+        report = {
+            "meta": {
+                "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "pdf": os.path.relpath(args.pdf, REPO_ROOT),
+                "settings": {key: value for key, value in vars(args).items() if key not in ("output", "pdf")},
+            },
+            "ingest": await bench_ingest(registry, args.pdf, args.ingest_repeats),
+            "retrieval": await bench_retrieval(registry, args.pdf, args.retrieval_queries),
+            "endpoints": await bench_endpoints(args.pdf, args.requests, args.concurrency),
+        }
+    finally:
+        shutdown_process_pool()
+        shutdown_executor()
+    report["peak_rss_mb"] = peak_rss_mb()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the generation pipeline")
+    parser.add_argument("--pdf", default=os.path.join(REPO_ROOT, "fabula.pdf"))
+    parser.add_argument("--requests", type=int, default=32, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--ingest-repeats", type=int, default=3)
+    parser.add_argument("--retrieval-queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=768, help="fake embedding size")
+    parser.add_argument("--embed-cost-ms", type=float, default=0.0, help="simulated embedding time per chunk")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="simulated seconds to first token")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="simulated seconds between streamed tokens")
+    parser.add_argument("--result-cache", action="store_true", help="leave the generation result cache on")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
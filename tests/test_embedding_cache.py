@@ -0,0 +1,86 @@
+import numpy as np
+
+from app.services.generation.embedding_cache import CachedEmbeddings, DiskVectorStore, embed_queries, embedding_key
+
+
+def test_two_stores_share_a_directory(tmp_path):
+    # Two instances on one directory behave like two uvicorn workers sharing the disk cache
+    a = DiskVectorStore(str(tmp_path), dtype="float32")
+    b = DiskVectorStore(str(tmp_path), dtype="float32")
+    key_a = embedding_key("model", "a")
+    key_b = embedding_key("model", "b")
+
+    a.put_many([key_a], np.array([[1, 0, 0, 0]], dtype=np.float32))
+    b.put_many([key_b], np.array([[0, 1, 0, 0]], dtype=np.float32))
+
+    assert b.get(key_b).tolist() == [0, 1, 0, 0]
+    assert b.get(key_a).tolist() == [1, 0, 0, 0]
+    assert a.get(key_b).tolist() == [0, 1, 0, 0]
+    assert a.get(key_a).tolist() == [1, 0, 0, 0]
+
+    fresh = DiskVectorStore(str(tmp_path), dtype="float32")
+    assert len(fresh) == 2
+    assert fresh.get(key_a).tolist() == [1, 0, 0, 0]
+    assert fresh.get(key_b).tolist() == [0, 1, 0, 0]
+
+
+def test_same_key_from_both_stores_is_written_once(tmp_path):
+    a = DiskVectorStore(str(tmp_path), dtype="float32")
+    b = DiskVectorStore(str(tmp_path), dtype="float32")
+    key = embedding_key("model", "shared")
+
+    a.put_many([key], np.array([[1, 2, 3, 4]], dtype=np.float32))
+    b.put_many([key], np.array([[1, 2, 3, 4]], dtype=np.float32))
+
+    assert len(DiskVectorStore(str(tmp_path), dtype="float32")) == 1
+    assert b.get(key).tolist() == [1, 2, 3, 4]
+
+
+def test_torn_append_is_repaired(tmp_path):
+    store = DiskVectorStore(str(tmp_path), dtype="float32")
+    store.put_many([embedding_key("model", "a")], np.array([[1, 0, 0, 0]], dtype=np.float32))
+    # A worker died after writing its vectors but before its keys
+    with open(tmp_path / "vectors.bin", "ab") as f:
+        f.write(np.array([[9, 9, 9, 9]], dtype=np.float32).tobytes())
+
+    other = DiskVectorStore(str(tmp_path), dtype="float32")
+    key_b = embedding_key("model", "b")
+    other.put_many([key_b], np.array([[0, 1, 0, 0]], dtype=np.float32))
+
+    assert DiskVectorStore(str(tmp_path), dtype="float32").get(key_b).tolist() == [0, 1, 0, 0]
+
+
+class _CountingEmbeddings:
+    def __init__(self):
+        self.batches = []
+
+    def embed_queries(self, texts):
+        self.batches.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+def test_query_misses_are_embedded_in_one_batch():
+    model = _CountingEmbeddings()
+    cached = CachedEmbeddings(model, "model")
+    cached.embed_query("cached")
+
+    vectors = cached.embed_queries(["cached", "one", "three", "one"])
+
+    assert model.batches == [["cached"], ["one", "three"]]
+    assert vectors == [[6.0, 1.0], [3.0, 1.0], [5.0, 1.0], [3.0, 1.0]]
+    assert embed_queries(cached, ["three"]) == [[5.0, 1.0]]
+    assert model.batches == [["cached"], ["one", "three"]]
+
+
+def test_table_stops_growing_at_max_rows(tmp_path):
+    a = DiskVectorStore(str(tmp_path), dtype="float32", max_rows=2)
+    b = DiskVectorStore(str(tmp_path), dtype="float32", max_rows=2)
+    keys = [embedding_key("model", text) for text in "abc"]
+
+    a.put_many(keys[:1], np.array([[1, 0]], dtype=np.float32))
+    b.put_many(keys[1:], np.array([[0, 1], [1, 1]], dtype=np.float32))
+
+    fresh = DiskVectorStore(str(tmp_path), dtype="float32", max_rows=2)
+    assert len(fresh) == 2
+    assert fresh.get(keys[1]).tolist() == [0, 1]
+    assert fresh.get(keys[2]) is None